@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+import last_folder_helper
+import phase_timing
+import slow_books
+import pipeline
+from result_cache import ResultCache
+from scan_engine import CHECKERS, load_checkers, apply_overrides, iter_results, report_book, report_summary, watch
+
+DOC_THREAD_CHECKERS = ('check_copyright', 'detect_empty_blocks', 'image_style', 'search_strings')
+
+SETTING_FLAGS = [
+    ('--size-threshold', (('check_cover_size', 'size_threshold'),),
+     {'type': float, 'metavar': 'KB', 'help': 'report covers larger than this many KB'}),
+    ('--pixel-threshold', (('check_small_cover', 'pixel_threshold'),),
+     {'type': int, 'metavar': 'PX', 'help': 'report covers whose long side is below this many pixels'}),
+    ('--min-png-size', (('contains_png', 'min_size'),),
+     {'type': int, 'metavar': 'BYTES', 'help': 'ignore PNG images smaller than this'}),
+    ('--min-blocks', (('detect_empty_blocks', 'MIN_BLOCKS'),),
+     {'type': int, 'metavar': 'N', 'help': 'minimum blocks per document for empty-block detection'}),
+    ('--empty-runs-ratio', (('detect_empty_blocks', 'EMPTY_RUNS_RATIO_THRESHOLD'),),
+     {'type': float, 'metavar': 'RATIO', 'help': 'share of blocks in empty runs that flags a document'}),
+    ('--copyright-confidence',
+     (('check_copyright', 'CONFIDENCE_THRESHOLD'), ('check_copyright_toc', 'CONFIDENCE_THRESHOLD')),
+     {'type': int, 'metavar': 'SCORE', 'help': 'minimum score for a copyright page match'}),
+    ('--problems-only', (('check_titlepage', 'problems_only'),),
+     {'action': 'store_true', 'default': None, 'help': 'only report titlepage problems'}),
+    ('--search-term', (('search_strings', 'search_terms'),),
+     {'action': 'append', 'metavar': 'TERM', 'help': 'search term, repeatable (replaces the defaults)'}),
+    ('--any-hit', (('search_strings', 'any_hit'),),
+     {'action': 'store_true', 'default': None, 'help': 'stop reading a book at the first search hit'}),
+    ('--max-count', (('search_strings', 'max_count'),),
+     {'type': int, 'metavar': 'N', 'help': 'stop counting a search term after N hits'}),
+    ('--index', (('search_strings', 'index_path'),),
+     {'metavar': 'DB', 'help': 'reuse and update the search_strings full-text index'}),
+    ('--fold-confusables', (('search_strings', 'fold_confusables'),),
+     {'action': 'store_true', 'default': None, 'help': 'ignore zero-width characters, fold accents and Cyrillic, Greek and Latin lookalikes, ignore spaces and punctuation inside single-word terms, and treat any run of them as one separator in multi-word terms'}),
+    ('--doc-threads', tuple((name, 'doc_threads') for name in DOC_THREAD_CHECKERS),
+     {'type': int, 'metavar': 'N', 'help': 'parse the documents of one book on N threads'}),
+]
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Run EPUB checkers over a library.')
+    parser.add_argument('targets', nargs='*', metavar='CHECKER|PATH',
+                        help='checker names to run and/or EPUB files or folders to scan')
+    parser.add_argument('--root', action='append', default=[], metavar='DIR', help='library folder to scan, repeatable')
+    parser.add_argument('--paths-from', metavar='FILE', help="read EPUB paths from FILE, one per line ('-' for stdin)")
+    parser.add_argument('--format', choices=('text', 'jsonl'), default='text', help='output format')
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes (0 for one per CPU)')
+    parser.add_argument('--cache', metavar='DB', help='persistent result cache database')
+    parser.add_argument('--watch', action='store_true', help='keep running and scan new or changed EPUBs under --root')
+    parser.add_argument('--prefetch', type=int, default=0, metavar='N',
+                        help='read archives into shared memory on N threads ahead of the worker processes')
+    parser.add_argument('--timing', action='store_true', help='record per-phase timings and report them at the end')
+    parser.add_argument('--slow-log', metavar='DIR',
+                        help='keep the slowest books per checker and, once the scan finishes, '
+                             'profile outliers into this folder')
+    parser.add_argument('--slow-keep', type=int, metavar='N', help='slowest books to keep per checker')
+    parser.add_argument('--slow-factor', type=float, metavar='X',
+                        help='profile a book taking more than X times the running median')
+    for flag, targets, kwargs in SETTING_FLAGS:
+        parser.add_argument(flag, dest=flag[2:].replace('-', '_'), **kwargs)
+    return parser
+
+def setting_overrides(args):
+    overrides = {}
+    for flag, targets, kwargs in SETTING_FLAGS:
+        value = getattr(args, flag[2:].replace('-', '_'))
+        if value is None:
+            continue
+        for checker, attr in targets:
+            overrides.setdefault(checker, {})[attr] = value
+    return overrides
+
+def split_targets(parser, targets):
+    names = []
+    roots = []
+    files = []
+    for target in targets:
+        if target in CHECKERS:
+            names.append(target)
+            continue
+        path = Path(target).expanduser()
+        if path.is_dir():
+            roots.append(path)
+        elif path.is_file():
+            files.append(path)
+        else:
+            parser.error(f"Unknown checker or path: {target}")
+    return names, roots, files
+
+def iter_paths(roots, files, paths_from):
+    for root in roots:
+        yield from sorted(Path(root).expanduser().resolve().rglob('*.epub'))
+    yield from files
+    if paths_from is None:
+        return
+    f = sys.stdin if paths_from == '-' else open(paths_from, encoding='utf-8')
+    try:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield Path(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def to_json(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((to_json(v) for v in value), key=repr)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+class TextReport:
+    def __init__(self, checkers, out):
+        self.checkers = checkers
+        self.out = out
+        self.prefix = len(checkers) > 1
+
+    def book(self, epub_path, results):
+        for line in report_book(epub_path, self.checkers, results, self.prefix):
+            self.out.write(line + '\n')
+        self.out.flush()
+
+    def summary(self, collected):
+        for line in report_summary(self.checkers, collected, self.prefix):
+            self.out.write(line + '\n')
+        self.out.flush()
+
+    def timing(self, rows):
+        for line in phase_timing.format_table(rows):
+            print(line, file=sys.stderr)
+
+    def stages(self, stats):
+        for line in stats.format():
+            print(line, file=sys.stderr)
+
+class JsonlReport:
+    def __init__(self, checkers, out):
+        self.checkers = checkers
+        self.out = out
+
+    def write(self, record):
+        self.out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.out.flush()
+
+    def book(self, epub_path, results):
+        entries = {}
+        for name, module in self.checkers:
+            result, error = results[name]
+            lines = [] if error is not None else module.format_book(epub_path, result)
+            entries[name] = {'result': to_json(result), 'error': error, 'lines': lines}
+        self.write({'type': 'book', 'path': str(epub_path), 'checkers': entries})
+
+    def summary(self, collected):
+        summaries = {}
+        for name, module in self.checkers:
+            format_summary = getattr(module, 'format_summary', None)
+            if format_summary is None:
+                continue
+            results = [(epub_path, result) for epub_path, result, error in collected[name] if error is None]
+            summaries[name] = format_summary(results)
+        if summaries:
+            self.write({'type': 'summary', 'checkers': summaries})
+
+    def timing(self, rows):
+        self.write({'type': 'timing', 'phases': rows})
+
+    def stages(self, stats):
+        self.write({'type': 'pipeline', 'stages': stats.rows()})
+
+def claim_stdout():
+    sys.stdout.flush()
+    out = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    return out
+
+def prompt_root():
+    default = last_folder_helper.get_last_folder()
+    user_input = input(f'Input folder ({default}): ').strip()
+    folder = user_input or default
+    if not folder:
+        folder = '.'
+    last_folder_helper.save_last_folder(folder)
+    return Path(folder)
+
+def run(args, parser, default_checkers=None):
+    names, roots, files = split_targets(parser, args.targets)
+    roots += [Path(root) for root in args.root]
+    if not (roots or files or args.paths_from):
+        if not sys.stdin.isatty():
+            parser.error('no input: give --root, --paths-from or EPUB paths')
+        roots.append(prompt_root())
+    for root in roots:
+        if not root.expanduser().is_dir():
+            parser.error(f"Folder not found: {root}")
+    if args.watch and (len(roots) != 1 or files or args.paths_from):
+        parser.error('--watch needs exactly one --root and no other inputs')
+    checkers = load_checkers(names or default_checkers)
+    overrides = setting_overrides(args)
+    apply_overrides(checkers, overrides)
+    jobs = args.jobs or os.cpu_count() or 1
+    out = claim_stdout() if args.format == 'jsonl' else sys.stdout
+    report = (JsonlReport if args.format == 'jsonl' else TextReport)(checkers, out)
+    cache = ResultCache(args.cache) if args.cache else None
+    phase_timing.enabled = args.timing
+    prefetcher = pipeline.Prefetcher(args.prefetch) if args.prefetch > 0 else None
+    slow_log = None
+    if args.slow_log:
+        if args.slow_keep is not None:
+            slow_books.keep_slowest = args.slow_keep
+        if args.slow_factor is not None:
+            slow_books.outlier_factor = args.slow_factor
+        slow_log = slow_books.SlowBookLog(checkers, args.slow_log)
+        slow_log.attach()
+    try:
+        if args.watch:
+            watch(roots[0].expanduser().resolve(), checkers, jobs, overrides, cache, report.book, prefetcher)
+            if args.timing:
+                report.timing(phase_timing.rows())
+            if prefetcher is not None:
+                report.stages(prefetcher.stats)
+            return 0
+        collected = {name: [] for name, _ in checkers}
+        scanned = 0
+        for epub_path, results in iter_results(iter_paths(roots, files, args.paths_from), checkers, jobs,
+                                               overrides, cache, prefetcher):
+            scanned += 1
+            for name, (result, error) in results.items():
+                collected[name].append((epub_path, result, error))
+            report.book(epub_path, results)
+        report.summary(collected)
+        if args.timing:
+            report.timing(phase_timing.rows())
+        if prefetcher is not None:
+            report.stages(prefetcher.stats)
+        print(f"Scanned {scanned} EPUB files with {len(checkers)} checkers", file=sys.stderr)
+    except BrokenPipeError:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, out.fileno())
+        return 1
+    finally:
+        if slow_log is not None:
+            slow_log.detach()
+            for line in slow_log.write():
+                print(line, file=sys.stderr)
+        if cache is not None:
+            print(f"Cache: {cache.hits} hits, {cache.misses} misses", file=sys.stderr)
+            cache.close()
+    return 0
+
+def main(argv=None, default_checkers=None):
+    parser = build_parser()
+    return run(parser.parse_args(argv), parser, default_checkers)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+import gc
+import io
+import os
+import sys
+import json
+import argparse
+import platform
+import threading
+import ctypes
+import ctypes.util
+import contextlib
+import tracemalloc
+from pathlib import Path
+import make_corpus
+from epub_book import EpubBook
+from bench_scan import load_corpus, git_revision
+from scan_engine import CHECKERS, load_checkers, prepare_checkers
+
+trace_frames = 8
+top_sites = 5
+rss_interval = 0.005
+snapshot_growth = 0.1
+report_limit = 20
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+MB = 1024 * 1024
+
+def load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None)
+        libc.malloc_trim
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+LIBC = load_libc()
+
+def trim_heap():
+    gc.collect()
+    if LIBC is not None:
+        LIBC.malloc_trim(0)
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+class RssSampler:
+    def __init__(self, interval=None, trace=False):
+        self.interval = interval or rss_interval
+        self.trace = trace
+        self.baseline = None
+        self.peak = None
+        self.snapshot = None
+        self.snapshot_bytes = 0
+        self.stop = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        if self.baseline is not None or self.trace:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss = current_rss()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+        if self.trace:
+            traced = tracemalloc.get_traced_memory()[0]
+            if self.snapshot is None or traced > self.snapshot_bytes * (1 + snapshot_growth):
+                self.snapshot = tracemalloc.take_snapshot()
+                self.snapshot_bytes = traced
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.sample()
+
+    @property
+    def growth(self):
+        if self.baseline is None:
+            return None
+        return self.peak - self.baseline
+
+def input_size(epub_path):
+    try:
+        with EpubBook(str(epub_path)) as book:
+            sizes = [book.index.getinfo(name).file_size for name in book.index]
+    except Exception as e:
+        return None, str(e)
+    return sum(sizes), max(sizes, default=0)
+
+def allocation_sites(snapshot):
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+    sites = []
+    for stat in snapshot.statistics('lineno')[:top_sites]:
+        frame = stat.traceback[0]
+        sites.append({'site': f"{Path(frame.filename).name}:{frame.lineno}", 'bytes': stat.size, 'blocks': stat.count})
+    return sites
+
+def measure(module, epub_path, trace):
+    error = None
+    trim_heap()
+    if trace:
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+    with RssSampler(trace=trace) as rss:
+        with EpubBook(str(epub_path)) as book:
+            try:
+                module.check_book(book)
+            except Exception as e:
+                error = str(e)
+        peak = tracemalloc.get_traced_memory()[1] if trace else None
+    return {
+        'peak': peak,
+        'rss_growth': rss.growth,
+        'sites': allocation_sites(rss.snapshot) if rss.snapshot is not None else [],
+        'sites_traced': rss.snapshot_bytes if rss.snapshot is not None else None,
+        'error': error,
+    }
+
+def peak_of(row):
+    return max(row['peak'] or 0, row['rss_growth'] or 0)
+
+def profile_corpus(epub_paths, names, trace):
+    checkers = load_checkers(names)
+    prepare_checkers(checkers)
+    rows = []
+    unreadable = []
+    if trace:
+        tracemalloc.start(trace_frames)
+    try:
+        for epub_path in epub_paths:
+            total, largest = input_size(epub_path)
+            if total is None:
+                unreadable.append({'path': str(epub_path), 'error': largest})
+                continue
+            for name, module in checkers:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    row = measure(module, epub_path, trace)
+                used = peak_of(row)
+                row.update({
+                    'checker': name,
+                    'path': str(epub_path),
+                    'input_bytes': total,
+                    'largest_member': largest,
+                    'ratio': used / total if total else None,
+                })
+                rows.append(row)
+    finally:
+        if trace:
+            tracemalloc.stop()
+    return rows, unreadable
+
+def summarize(rows, names):
+    summary = {}
+    for name in names:
+        peaks = sorted(peak_of(row) for row in rows if row['checker'] == name)
+        ratios = [row['ratio'] for row in rows if row['checker'] == name and row['ratio'] is not None]
+        if not peaks:
+            continue
+        summary[name] = {
+            'books': len(peaks),
+            'median_peak': peaks[len(peaks) // 2],
+            'max_peak': peaks[-1],
+            'max_ratio': max(ratios, default=None),
+        }
+    return summary
+
+def format_report(rows, summary, limit, unreadable=()):
+    lines = [f"{'checker':<24} {'books':>6} {'median MB':>10} {'max MB':>9} {'max ratio':>10}"]
+    for name, entry in summary.items():
+        ratio = f"{entry['max_ratio']:10.2f}" if entry['max_ratio'] is not None else f"{'-':>10}"
+        lines.append(f"{name:<24} {entry['books']:>6} {entry['median_peak'] / MB:>10.2f} "
+                     f"{entry['max_peak'] / MB:>9.2f} {ratio}")
+    worst = sorted((row for row in rows if row['ratio'] is not None), key=lambda row: -row['ratio'])[:limit]
+    if worst:
+        lines.append('')
+        lines.append(f"Worst {len(worst)} by peak / uncompressed input (sites: largest allocations in the sample "
+                     f"taken nearest the traced peak):")
+    for row in worst:
+        rss = f", rss +{row['rss_growth'] / MB:.1f}MB" if row['rss_growth'] is not None else ''
+        lines.append(f"{row['ratio']:8.2f}x {peak_of(row) / MB:8.2f}MB  {row['checker']:<20} {Path(row['path']).name} "
+                     f"(input {row['input_bytes'] / MB:.2f}MB, largest member {row['largest_member'] / MB:.2f}MB{rss})")
+        if row['sites']:
+            lines.append(f"           sampled at {row['sites_traced'] / MB:.2f}MB of the {row['peak'] / MB:.2f}MB traced peak")
+        for site in row['sites']:
+            lines.append(f"           {site['bytes'] / MB:8.2f}MB {site['blocks']:>8} blocks  {site['site']}")
+    for entry in unreadable:
+        lines.append(f"Unreadable: {entry['path']} ({entry['error']})")
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure peak memory per checker per book.')
+    parser.add_argument('corpus', nargs='?', default=None, help='corpus folder (generated if missing or empty)')
+    parser.add_argument('--books', type=int, default=make_corpus.books)
+    parser.add_argument('--seed', type=int, default=make_corpus.seed)
+    parser.add_argument('--checkers', nargs='+', default=CHECKERS, choices=CHECKERS, metavar='NAME')
+    parser.add_argument('--rss-only', action='store_true', help='skip tracemalloc and only sample RSS')
+    parser.add_argument('--limit', type=int, default=report_limit, help='worst books to list')
+    parser.add_argument('--budget', type=float, metavar='MB', help='fail if any checker peaks above this on one book')
+    parser.add_argument('--output', metavar='JSON', help='write per-book measurements to this file')
+    args = parser.parse_args(argv)
+    corpus, epub_paths = load_corpus(args.corpus, args.books, args.seed)
+    print(f"Corpus: {len(epub_paths)} books in {corpus}")
+    trace = not args.rss_only
+    rows, unreadable = profile_corpus(epub_paths, args.checkers, trace)
+    summary = summarize(rows, args.checkers)
+    for line in format_report(rows, summary, args.limit, unreadable):
+        print(line)
+    over = []
+    if args.budget is not None:
+        over = [row for row in rows if peak_of(row) > args.budget * MB]
+        for row in sorted(over, key=lambda row: -peak_of(row))[:args.limit]:
+            print(f"Over budget: {row['checker']} peaked at {peak_of(row) / MB:.2f}MB on {row['path']}")
+        if over:
+            print(f"{len(over)} checker runs exceeded the {args.budget:g}MB budget")
+    if args.output:
+        report = {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'tracemalloc': trace,
+            'budget_mb': args.budget,
+            'summary': summary,
+            'books': rows,
+            'unreadable': unreadable,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+    return 1 if over else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
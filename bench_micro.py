@@ -0,0 +1,284 @@
+import io
+import sys
+import json
+import time
+import random
+import os
+import hashlib
+import argparse
+import platform
+import contextlib
+from pathlib import Path, PurePosixPath
+import make_corpus
+from epub_book import EpubBook, normalize_member, resolve_href
+from image_probe import probe_image
+from term_matcher import TermMatcher, get_matcher
+from confusables import fold
+from check_copyright import extract_text_from_xhtml, score_file
+from detect_empty_blocks import analyze_blocks_in_html_bytes
+from check_titlepage import analyze_content, classify_titlepage, find_first_content_path
+from complex_scan import analyze_dom_structure
+from search_strings import SEARCH_STRINGS
+
+sample_books = 12
+sample_seed = 20
+docs_per_book = 6
+min_time = 0.1
+repeat = 7
+threshold = 0.25
+stress_recursion_limit = 100
+crossover_counts = (24, 50, 100, 150, 200, 300, 400)
+BASELINE_PATH = Path(__file__).resolve().parent / 'micro_baselines.json'
+
+def cpu_model():
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith(('model name', 'Hardware', 'cpu model')):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or 'unknown cpu'
+
+def host_signature():
+    return (f"{platform.system()} {platform.machine()} | {cpu_model()} | {os.cpu_count()} cpus | "
+            f"{platform.python_implementation()} {'.'.join(platform.python_version_tuple()[:2])}")
+
+def load_baselines(path):
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text()).get('hosts', {})
+
+def sample_inputs():
+    rng = random.Random(sample_seed)
+    inputs = {'members': [], 'hrefs': [], 'lookups': [], 'images': [], 'documents': [], 'texts': [],
+              'titlepages': [], 'lowered': []}
+    for index in range(sample_books):
+        name, data = make_corpus.make_book(random.Random(rng.getrandbits(64)), index)
+        with EpubBook(io.BytesIO(data)) as book:
+            opf_dir = book.opf_dir
+            for item in book.manifest.values():
+                inputs['hrefs'].append((opf_dir, item.href))
+                inputs['members'].append((f"{PurePosixPath(item.path).parent}/../{opf_dir}/./{item.href}",))
+                inputs['lookups'].append((book.index, item.path.upper()))
+            inputs['members'].extend((member,) for member in book.index)
+            if book.cover_path:
+                inputs['images'].append((book.read(book.cover_path),))
+            for path in book.spine_paths[:docs_per_book]:
+                text = extract_text_from_xhtml(book, path)
+                inputs['documents'].append((book.read(path),))
+                inputs['texts'].append((path, text))
+                inputs['lowered'].append((text.lower(),))
+            first_path, first_href = find_first_content_path(book)
+            if first_path is not None:
+                title = book.opf_root.xpath('.//dc:title/text()', namespaces={'dc': 'http://purl.org/dc/elements/1.1/'})
+                indicators = analyze_content(book, first_path, title[0] if title else '', None, None)
+                inputs['titlepages'].append((Path(first_href).name.lower(), indicators))
+    return inputs
+
+def inputs_fingerprint(inputs):
+    h = hashlib.sha1()
+    for key in sorted(inputs):
+        h.update(key.encode())
+        h.update(str(len(inputs[key])).encode())
+        for args in inputs[key]:
+            h.update(repr([a if isinstance(a, (str, bytes, dict, tuple)) else len(a) for a in args]).encode())
+    return h.hexdigest()[:16]
+
+def benchmarks(inputs):
+    matcher = get_matcher(tuple(SEARCH_STRINGS))
+    return {
+        'epub_book.normalize_member': (normalize_member, inputs['members']),
+        'epub_book.resolve_href': (resolve_href, inputs['hrefs']),
+        'ArchiveIndex.resolve': (lambda index, name: index.resolve(name), inputs['lookups']),
+        'image_probe.probe_image': (lambda data: probe_image(io.BytesIO(data)), inputs['images']),
+        'check_copyright.score_file': (score_file, inputs['texts']),
+        'detect_empty_blocks.analyze_blocks_in_html_bytes': (analyze_blocks_in_html_bytes, inputs['documents']),
+        'check_titlepage.classify_titlepage': (classify_titlepage, inputs['titlepages']),
+        'TermMatcher.count': (matcher.count, inputs['lowered']),
+        'confusables.fold': (fold, inputs['lowered']),
+    }
+
+def stress_cases():
+    cases = {}
+    for kind in make_corpus.STRESS_KINDS:
+        _, data = make_corpus.make_stress_book(kind)
+        book = EpubBook(io.BytesIO(data))
+        path = book.spine_paths[0]
+        cases[f'complex_scan.analyze_dom_structure[{kind}]'] = (
+            analyze_dom_structure, [(book, path)], lambda result: result['has_headings'])
+        cases[f'check_titlepage.analyze_content[{kind}]'] = (
+            analyze_content, [(book, path, '', None, None)], lambda result: result['has_cover_class'])
+    return cases
+
+def check_stress(cases):
+    failures = []
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(stress_recursion_limit)
+    try:
+        for name, (fn, args_list, expected) in cases.items():
+            try:
+                passed = all(expected(fn(*args)) for args in args_list)
+            except RecursionError:
+                passed = False
+            if not passed:
+                failures.append(name)
+    finally:
+        sys.setrecursionlimit(limit)
+    return failures
+
+def crossover_terms(texts, count):
+    rng = random.Random(sample_seed + count)
+    words = sorted({word for text in texts for word in text.split() if len(word) > 3})
+    terms = []
+    for i in range(count):
+        if i % 2 and len(words) > 1:
+            terms.append(' '.join(rng.sample(words, 2)))
+        else:
+            terms.append(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz.') for _ in range(rng.randint(5, 14))))
+    return terms
+
+def automaton_crossover(inputs):
+    texts = [text for text, in inputs['lowered']]
+    rows = []
+    for count in crossover_counts:
+        terms = crossover_terms(texts, count)
+        row = [count]
+        for automaton in (False, True):
+            matcher = TermMatcher(terms, automaton=automaton)
+            loops = loops_for(matcher.count, inputs['lowered'])
+            row.append(min(run_loops(matcher.count, inputs['lowered'], loops) for _ in range(repeat)) / loops)
+        rows.append(tuple(row))
+    return rows
+
+def calibration_workload():
+    total = 0
+    words = {}
+    for i in range(20000):
+        total += i * i
+        key = str(i % 97)
+        words[key] = words.get(key, 0) + 1
+    return total, len(words)
+
+def run_loops(fn, args_list, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        for args in args_list:
+            fn(*args)
+    return time.perf_counter() - start
+
+def loops_for(fn, args_list):
+    loops = 1
+    while True:
+        elapsed = run_loops(fn, args_list, loops)
+        if elapsed >= min_time:
+            return loops
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)) + 1)
+
+def time_paired(fn, args_list):
+    loops = loops_for(fn, args_list)
+    calibration_loops = loops_for(calibration_workload, [()])
+    times = []
+    ratios = []
+    for _ in range(repeat):
+        before = run_loops(calibration_workload, [()], calibration_loops) / calibration_loops
+        elapsed = run_loops(fn, args_list, loops) / (loops * len(args_list))
+        after = run_loops(calibration_workload, [()], calibration_loops) / calibration_loops
+        times.append(elapsed)
+        ratios.append(elapsed / min(before, after))
+    ratios.sort()
+    return min(times), ratios[len(ratios) // 2]
+
+def measure(names=None):
+    inputs = sample_inputs()
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'host': host_signature(),
+        'inputs': inputs_fingerprint(inputs),
+        'benchmarks': {},
+    }
+    cases = stress_cases()
+    with contextlib.redirect_stdout(io.StringIO()):
+        report['stress_failures'] = check_stress(cases)
+    table = benchmarks(inputs)
+    table.update((name, (fn, args_list)) for name, (fn, args_list, _) in cases.items())
+    for name, (fn, args_list) in table.items():
+        if names and name not in names:
+            continue
+        if not args_list:
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            best, relative = time_paired(fn, args_list)
+        report['benchmarks'][name] = {'ns_per_call': best * 1e9, 'relative': relative, 'calls': len(args_list)}
+    return report
+
+def compare(report, baseline, limit):
+    if baseline.get('inputs') != report['inputs']:
+        print("Warning: baseline was measured on different sample inputs")
+    regressions = []
+    for name, entry in report['benchmarks'].items():
+        old = baseline['benchmarks'].get(name)
+        ns = entry['ns_per_call']
+        if old is None:
+            print(f"{name:<50} {ns:>12.0f} ns  (new)")
+            continue
+        change = entry['relative'] / old['relative'] - 1
+        flag = ''
+        if change > limit:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<50} {ns:>12.0f} ns  {change * 100:+7.1f}%{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmark hot helpers against stored baselines.')
+    parser.add_argument('names', nargs='*', help='only run these benchmarks')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH), help='baseline JSON file')
+    parser.add_argument('--update', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--crossover', action='store_true',
+                        help='time the find and automaton term matchers over a range of pattern counts')
+    parser.add_argument('--threshold', type=float, default=threshold,
+                        help='fail when a benchmark is this much slower than baseline (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+    if args.crossover:
+        rows = automaton_crossover(sample_inputs())
+        for count, find_time, automaton_time in rows:
+            print(f"{count:>5} patterns  find {find_time * 1e3:>9.2f} ms  automaton {automaton_time * 1e3:>9.2f} ms  "
+                  f"ratio {automaton_time / find_time:>5.2f}")
+        faster = [count for count, find_time, automaton_time in rows if automaton_time < find_time]
+        print(f"Automaton first faster at {faster[0]} patterns" if faster else "Automaton never faster")
+        return 0
+    report = measure(args.names)
+    failures = report.pop('stress_failures')
+    for name in failures:
+        print(f"Stress check failed: {name} (wrong result or recursion under a limit of {stress_recursion_limit})")
+    if failures:
+        return 1
+    baseline_path = Path(args.baseline)
+    hosts = load_baselines(baseline_path)
+    host = report['host']
+    if args.update:
+        if args.names and host in hosts:
+            stored = hosts[host]['benchmarks']
+            stored.update(report['benchmarks'])
+            report['benchmarks'] = stored
+        hosts[host] = report
+        baseline_path.write_text(json.dumps({'hosts': hosts}, indent=2, sort_keys=True) + '\n')
+        for name, entry in report['benchmarks'].items():
+            print(f"{name:<50} {entry['ns_per_call']:>12.0f} ns")
+        print(f"Baseline for {host} written to {baseline_path}")
+        return 0
+    if host not in hosts:
+        for name, entry in report['benchmarks'].items():
+            print(f"{name:<50} {entry['ns_per_call']:>12.0f} ns")
+        print(f"No baseline for {host} in {baseline_path}; not gating. Run with --update to store one")
+        return 0
+    regressions = compare(report, hosts[host], args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold * 100:.0f}%")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
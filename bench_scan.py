@@ -0,0 +1,150 @@
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from pathlib import Path
+from lxml import etree
+import make_corpus
+import phase_timing
+from scan_engine import CHECKERS, load_checkers, prepare_checkers, scan_book, iter_results
+
+repeat = 3
+extra_benchmarks = ['get_covers', 'engine']
+
+def corpus_fingerprint(epub_paths):
+    h = hashlib.sha1()
+    for path in epub_paths:
+        h.update(path.name.encode())
+        h.update(Path(path).read_bytes())
+    return h.hexdigest()[:16]
+
+def load_corpus(corpus, books, seed):
+    corpus = Path(corpus or Path(tempfile.gettempdir()) / f'epub_bench_{seed}_{books}')
+    epub_paths = sorted(corpus.rglob('*.epub')) if corpus.is_dir() else []
+    if not epub_paths:
+        epub_paths = make_corpus.generate(corpus, books, seed)
+    return corpus, epub_paths
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).resolve().parent,
+                             capture_output=True, text=True, timeout=10)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               cwd=Path(__file__).resolve().parent, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if out.returncode != 0:
+        return None
+    return out.stdout.strip() + ('-dirty' if dirty.stdout.strip() else '')
+
+def run_checker(epub_paths, checkers):
+    for epub_path in epub_paths:
+        scan_book(epub_path, checkers)
+
+def run_get_covers(epub_paths):
+    import get_covers
+    with tempfile.TemporaryDirectory() as out_dir:
+        for epub_path in epub_paths:
+            phase_timing.start_book()
+            with phase_timing.checker('get_covers'):
+                get_covers.process_single_epub(epub_path, Path(out_dir), get_covers.max_dimension,
+                                               get_covers.convert_to_jpg)
+            phase_timing.finish_book(epub_path)
+
+def run_engine(epub_paths, checkers, jobs):
+    for _ in iter_results(epub_paths, checkers, jobs):
+        pass
+
+def best_time(fn, count):
+    times = []
+    for _ in range(count):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    return min(times), times
+
+def benchmark(epub_paths, names, count, jobs):
+    total_bytes = sum(path.stat().st_size for path in epub_paths)
+    rows = {}
+    for name in names:
+        if name == 'get_covers':
+            fn = lambda: run_get_covers(epub_paths)
+        elif name == 'engine':
+            checkers = load_checkers()
+            prepare_checkers(checkers)
+            fn = lambda: run_engine(epub_paths, checkers, jobs)
+        else:
+            checkers = load_checkers([name])
+            prepare_checkers(checkers)
+            fn = lambda: run_checker(epub_paths, checkers)
+        best, times = best_time(fn, count)
+        rows[name] = {
+            'seconds': best,
+            'runs': times,
+            'books_per_sec': len(epub_paths) / best if best else None,
+            'mb_per_sec': total_bytes / (1024 * 1024) / best if best else None,
+        }
+        print(f"{name:<24} {best:8.3f}s {rows[name]['books_per_sec']:9.1f} books/s {rows[name]['mb_per_sec']:8.2f} MB/s",
+              flush=True)
+    return rows
+
+def compare(report, baseline):
+    if baseline.get('corpus', {}).get('fingerprint') != report['corpus']['fingerprint']:
+        print("Warning: baseline was measured on a different corpus")
+    print(f"\nAgainst {baseline.get('revision') or 'baseline'}:")
+    for name, row in report['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            continue
+        print(f"{name:<24} {old['seconds']:8.3f}s -> {row['seconds']:8.3f}s  x{old['seconds'] / row['seconds']:.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time each checker over a synthetic EPUB corpus.')
+    parser.add_argument('corpus', nargs='?', default=None, help='corpus folder (generated if missing or empty)')
+    parser.add_argument('--books', type=int, default=make_corpus.books)
+    parser.add_argument('--seed', type=int, default=make_corpus.seed)
+    parser.add_argument('--checkers', nargs='+', default=CHECKERS + extra_benchmarks,
+                        choices=CHECKERS + extra_benchmarks, metavar='NAME')
+    parser.add_argument('--repeat', type=int, default=repeat)
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes for the engine benchmark')
+    parser.add_argument('--output', metavar='JSON', help='write results to this file')
+    parser.add_argument('--compare', metavar='JSON', help='compare against an earlier --output file')
+    parser.add_argument('--timing', action='store_true', help='also record and print per-phase timings (adds overhead)')
+    args = parser.parse_args(argv)
+    corpus, epub_paths = load_corpus(args.corpus, args.books, args.seed)
+    total_bytes = sum(path.stat().st_size for path in epub_paths)
+    phase_timing.enabled = args.timing
+    print(f"Corpus: {len(epub_paths)} books, {total_bytes / (1024 * 1024):.1f}MB in {corpus}")
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'lxml': '.'.join(map(str, etree.LXML_VERSION)),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': args.repeat,
+        'jobs': args.jobs,
+        'corpus': {'path': str(corpus), 'books': len(epub_paths), 'bytes': total_bytes,
+                   'fingerprint': corpus_fingerprint(epub_paths)},
+        'results': benchmark(epub_paths, args.checkers, args.repeat, args.jobs),
+    }
+    if args.timing:
+        report['timing'] = phase_timing.rows()
+        print()
+        for line in phase_timing.format_table(report['timing']):
+            print(line)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
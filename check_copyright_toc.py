@@ -1,77 +1,18 @@
 import sys
-import zipfile
 from pathlib import Path, PurePosixPath
-from lxml import etree
-from urllib.parse import unquote
 import last_folder_helper
-from complex_scan import find_opf_path
-from check_copyright import resolve_href, get_spine_xhtml_paths, extract_text_from_xhtml, score_file, CONFIDENCE_THRESHOLD
+from epub_book import EpubBook
+from check_copyright import get_spine_xhtml_paths, extract_text_from_xhtml, score_file, CONFIDENCE_THRESHOLD
 
-def normalize_path(base_path, href, namelist):
-    decoded = unquote(href)
-    if decoded in namelist:
-        return decoded
-    if not base_path:
-        return PurePosixPath(decoded).as_posix()
-    resolved = (PurePosixPath(base_path).parent / PurePosixPath(decoded)).as_posix()
-    parts = PurePosixPath(resolved).parts
-    normalized = []
-    for part in parts:
-        if part == '..':
-            if normalized:
-                normalized.pop()
-        elif part != '.':
-            normalized.append(part)
-    return '/'.join(normalized) if normalized else ''
-
-def strip_fragment(href):
-    return href.split('#', 1)[0]
-
-def parse_opf(z, opf_path):
-    with z.open(opf_path) as f:
-        parser = etree.XMLParser(recover=True)
-        tree = etree.parse(f, parser)
-        root = tree.getroot()
-        epub_version = root.get('version') or ''
-        opf_ns = None
-        for ns in (root.nsmap or {}).values():
-            if ns and 'opf' in ns:
-                opf_ns = ns
-                break
-        if opf_ns is None:
-            opf_ns = 'http://www.idpf.org/2007/opf'
-        ns = {'opf': opf_ns}
-        manifest = {}
-        manifest_el = root.find('opf:manifest', ns)
-        if manifest_el is not None:
-            for item in manifest_el.findall('opf:item', ns):
-                iid = item.get('id')
-                href = item.get('href')
-                media = item.get('media-type')
-                props = item.get('properties') or ''
-                if iid and href:
-                    manifest[iid] = {'href': href, 'media-type': media, 'properties': props}
-        spine = []
-        spine_toc = None
-        spine_el = root.find('opf:spine', ns)
-        if spine_el is not None:
-            spine_toc = spine_el.get('toc')
-            for itemref in spine_el.findall('opf:itemref', ns):
-                idref = itemref.get('idref')
-                if idref:
-                    spine.append(idref)
-        opf_dir = PurePosixPath(opf_path).parent.as_posix()
-        return manifest, spine, opf_dir, spine_toc, epub_version
-
-def find_copyright_path(z, manifest, spine, opf_dir):
-    xhtml_paths = get_spine_xhtml_paths(z, manifest, spine, opf_dir)
+def find_copyright_path(book):
+    xhtml_paths = get_spine_xhtml_paths(book)
     if not xhtml_paths:
         return None
     best_index = None
     best_score = 0
     second_score = 0
     for i, zip_path in enumerate(xhtml_paths):
-        text = extract_text_from_xhtml(z, zip_path)
+        text = extract_text_from_xhtml(book, zip_path)
         score = score_file(zip_path, text)
         if score > best_score:
             second_score = best_score
@@ -85,95 +26,92 @@ def find_copyright_path(z, manifest, spine, opf_dir):
         return None
     return xhtml_paths[best_index]
 
-def extract_ncx_hrefs(z, opf_dir, manifest, spine_toc):
-    ncx_id = None
-    if spine_toc and spine_toc in manifest:
-        ncx_id = spine_toc
-    else:
-        for iid, item in manifest.items():
-            if (item.get('media-type') or '') == 'application/x-dtbncx+xml':
-                ncx_id = iid
-                break
-    if not ncx_id:
+def extract_ncx_hrefs(book):
+    ncx_item = book.ncx_item
+    if ncx_item is None:
         return None, 'NO NCX FOUND'
-    ncx_href = resolve_href(opf_dir, manifest[ncx_id]['href'])
-    if ncx_href not in z.namelist():
+    ncx_href = ncx_item.path
+    if ncx_href not in book.index:
         return None, f'NCX file missing from zip: {ncx_href}'
     try:
-        with z.open(ncx_href) as f:
-            parser = etree.XMLParser(recover=True)
-            tree = etree.parse(f, parser)
-            root = tree.getroot()
-            ncx_ns = (root.nsmap or {}).get(None, '')
-            if ncx_ns:
-                content_elems = tree.findall(f'.//{{{ncx_ns}}}content')
-            else:
-                content_elems = tree.findall('.//content')
-            return [(c.get('src'), ncx_href) for c in content_elems if c.get('src')], None
+        root = book.xml_root(ncx_href)
+        ncx_ns = (root.nsmap or {}).get(None, '')
+        if ncx_ns:
+            content_elems = root.findall(f'.//{{{ncx_ns}}}content')
+        else:
+            content_elems = root.findall('.//content')
+        return [(c.get('src'), ncx_href) for c in content_elems if c.get('src')], None
     except Exception as e:
         return None, f'NCX parse error: {e}'
 
-def extract_human_toc_hrefs(z, manifest, spine, opf_dir):
+def extract_human_toc_hrefs(book):
     results = []
-    for idref in spine:
-        item = manifest.get(idref)
-        if not item:
-            continue
-        href = resolve_href(opf_dir, item['href'])
+    for item in book.spine_items:
+        href = item.path
         filename = PurePosixPath(href).name.lower()
         if 'toc' not in filename and 'contents' not in filename:
             continue
-        if href not in z.namelist():
+        if href not in book.index:
             continue
         try:
-            with z.open(href) as f:
-                parser = etree.HTMLParser(recover=True)
-                tree = etree.parse(f, parser)
-                anchors = tree.findall('.//{http://www.w3.org/1999/xhtml}a') or tree.findall('.//a')
-                for a in anchors:
-                    link = a.get('href')
-                    if link:
-                        results.append((link, href))
+            tree = book.html_root(href)
+            anchors = tree.findall('.//{http://www.w3.org/1999/xhtml}a') or tree.findall('.//a')
+            for a in anchors:
+                link = a.get('href')
+                if link:
+                    results.append((link, href))
         except Exception:
             continue
     return results
 
-def hrefs_contain_path(hrefs, copyright_path, namelist):
+def hrefs_contain_path(book, hrefs, copyright_path):
     target_parts = PurePosixPath(copyright_path).parts
     for href, source_path in hrefs:
-        base = strip_fragment(href)
-        normalized = normalize_path(source_path, base, namelist)
+        normalized = book.resolve_link(source_path, href)
         if PurePosixPath(normalized).parts == target_parts:
             return True
     return False
 
 def analyze_epub(epub_path):
+    with EpubBook(epub_path) as book:
+        return check_book(book)
+
+def check_book(book):
     warnings = []
     try:
-        with zipfile.ZipFile(epub_path, 'r') as z:
-            opf_path = find_opf_path(z)
-            if opf_path is None:
-                return None, ['OPF not found']
-            manifest, spine, opf_dir, spine_toc, epub_version = parse_opf(z, opf_path)
-            if epub_version.startswith('3'):
-                warnings.append(f'EPUB3 detected (results may be unreliable)')
-            ncx_hrefs, ncx_error = extract_ncx_hrefs(z, opf_dir, manifest, spine_toc)
-            if ncx_error:
-                warnings.append(ncx_error)
-            copyright_path = find_copyright_path(z, manifest, spine, opf_dir)
-            if copyright_path is None:
-                return None, warnings
-            namelist = set(z.namelist())
-            hits = []
-            if ncx_hrefs and hrefs_contain_path(ncx_hrefs, copyright_path, namelist):
-                hits.append('in ncx')
-            human_hrefs = extract_human_toc_hrefs(z, manifest, spine, opf_dir)
-            if hrefs_contain_path(human_hrefs, copyright_path, namelist):
-                hits.append('in human toc page')
-            return (hits if hits else None), warnings
+        if book.opf_path is None:
+            return None, ['OPF not found']
+        if book.version.startswith('3'):
+            warnings.append(f'EPUB3 detected (results may be unreliable)')
+        ncx_hrefs, ncx_error = extract_ncx_hrefs(book)
+        if ncx_error:
+            warnings.append(ncx_error)
+        copyright_path = find_copyright_path(book)
+        if copyright_path is None:
+            return None, warnings
+        hits = []
+        if ncx_hrefs and hrefs_contain_path(book, ncx_hrefs, copyright_path):
+            hits.append('in ncx')
+        human_hrefs = extract_human_toc_hrefs(book)
+        if hrefs_contain_path(book, human_hrefs, copyright_path):
+            hits.append('in human toc page')
+        return (hits if hits else None), warnings
     except Exception as e:
         return None, [f'error: {e}']
 
+def format_book(epub_path, result):
+    hits, warnings = result
+    name = epub_path.name.replace('.epub', '')
+    lines = [f"{name}: {w}" for w in warnings]
+    if hits:
+        lines.append(f"{name}: {', '.join(hits)}")
+    return lines
+
+def format_summary(results):
+    if not any(result[0] for _, result in results):
+        return ["No copyright pages found in any TOC"]
+    return []
+
 def main(folder):
     p = Path(folder).expanduser().resolve()
     if not p.is_dir():
@@ -183,19 +121,19 @@ def main(folder):
     if not epub_paths:
         print("No EPUB files found")
         return
-    found = 0
+    results = []
     for epub_path in epub_paths:
-        result, warnings = analyze_epub(str(epub_path))
-        name = epub_path.name.replace('.epub', '')
-        for w in warnings:
-            print(f"{name}: {w}")
-        if result:
-            found += 1
-            print(f"{name}: {', '.join(result)}")
-    if found == 0:
-        print("No copyright pages found in any TOC")
+        result = analyze_epub(str(epub_path))
+        results.append((epub_path, result))
+        for line in format_book(epub_path, result):
+            print(line)
+    for line in format_summary(results):
+        print(line)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 or not sys.stdin.isatty():
+        import batch_cli
+        sys.exit(batch_cli.main(sys.argv[1:], ['check_copyright_toc']))
     default = last_folder_helper.get_last_folder()
     user_input = input(f'Input folder ({default}): ').strip()
     folder = user_input or default
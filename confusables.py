@@ -0,0 +1,101 @@
+import re
+import unicodedata
+from functools import lru_cache
+from term_matcher import get_matcher
+
+CYRILLIC_LOOKALIKES = {
+    'а': 'a', 'с': 'c', 'ԁ': 'd', 'е': 'e', 'ё': 'e', 'һ': 'h', 'н': 'h', 'і': 'i', 'ї': 'i', 'ј': 'j',
+    'к': 'k', 'ӏ': 'l', 'м': 'm', 'о': 'o', 'р': 'p', 'ԛ': 'q', 'ѕ': 's', 'т': 't', 'у': 'y', 'ү': 'y',
+    'ԝ': 'w', 'х': 'x',
+}
+# Greek letters fold by shape, not by transliteration (γ->y, η->n, ν->v, υ->u), and genuine Greek text folds too.
+GREEK_LOOKALIKES = {
+    'α': 'a', 'β': 'b', 'γ': 'y', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p',
+    'τ': 't', 'υ': 'u', 'χ': 'x', 'ϲ': 'c',
+}
+LATIN_LOOKALIKES = {'ı': 'i', 'ȷ': 'j', 'ɑ': 'a', 'ɡ': 'g', 'ℓ': 'l', 'ſ': 's'}
+HOMOGLYPHS = {**CYRILLIC_LOOKALIKES, **GREEK_LOOKALIKES, **LATIN_LOOKALIKES}
+FOLD_RANGES = ((0x0000, 0x3040), (0xFE00, 0x10000), (0x1D400, 0x1D800), (0xE0000, 0xE0080))
+INVISIBLE_CATEGORIES = frozenset(('Cc', 'Cf', 'Mn', 'Me'))
+SPACE_RUNS = re.compile('  +')
+
+@lru_cache(maxsize=None)
+def fold_table():
+    table = {}
+    for start, end in FOLD_RANGES:
+        for cp in range(start, end):
+            ch = chr(cp)
+            category = unicodedata.category(ch)
+            if ch in HOMOGLYPHS:
+                table[cp] = HOMOGLYPHS[ch]
+            elif ch.isspace() or category[0] in 'PZ':
+                if ch != ' ':
+                    table[cp] = ' '
+            elif category in INVISIBLE_CATEGORIES:
+                table[cp] = None
+            elif ch.isalnum():
+                base = ''.join(c for c in unicodedata.normalize('NFKD', ch) if not unicodedata.combining(c)).lower()
+                if base != ch and len(base) == 1 and base.isascii() and base.isalnum():
+                    table[cp] = base
+    return table
+
+def fold(text):
+    return SPACE_RUNS.sub(' ', text.translate(fold_table()))
+
+def fold_term(term):
+    return fold(term.lower()).strip(' ')
+
+class FoldedMatcher:
+    __slots__ = ('terms', 'spaced', 'compact', 'spaced_matcher', 'compact_matcher')
+
+    def __init__(self, terms):
+        self.terms = tuple(terms)
+        folded = [fold_term(term) for term in self.terms]
+        self.spaced = [i for i, term in enumerate(folded) if ' ' in term]
+        self.compact = [i for i, term in enumerate(folded) if ' ' not in term]
+        self.spaced_matcher = get_matcher([folded[i] for i in self.spaced]) if self.spaced else None
+        self.compact_matcher = get_matcher([folded[i] for i in self.compact]) if self.compact else None
+
+    def stream(self):
+        return FoldedStream(self)
+
+    def count(self, text):
+        stream = self.stream()
+        stream.feed(text)
+        return stream.results()
+
+class FoldedStream:
+    __slots__ = ('folded', 'spaced', 'compact', 'space')
+
+    def __init__(self, folded):
+        self.folded = folded
+        self.spaced = folded.spaced_matcher.stream() if folded.spaced_matcher is not None else None
+        self.compact = folded.compact_matcher.stream() if folded.compact_matcher is not None else None
+        self.space = False
+
+    def feed(self, text):
+        text = text.translate(fold_table())
+        if self.compact is not None:
+            self.compact.feed(text.replace(' ', ''))
+        if self.spaced is not None:
+            text = SPACE_RUNS.sub(' ', text)
+            if self.space and text.startswith(' '):
+                text = text[1:]
+            if text:
+                self.space = text.endswith(' ')
+                self.spaced.feed(text)
+
+    def results(self):
+        counts = [0] * len(self.folded.terms)
+        for indices, stream in ((self.folded.spaced, self.spaced), (self.folded.compact, self.compact)):
+            if stream is not None:
+                for i, (_, count) in zip(indices, stream.results()):
+                    counts[i] = count
+        return list(zip(self.folded.terms, counts))
+
+@lru_cache(maxsize=32)
+def _compile(terms):
+    return FoldedMatcher(terms)
+
+def get_folded_matcher(terms):
+    return _compile(tuple(terms))
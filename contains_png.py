@@ -1,9 +1,33 @@
-import zipfile
+import sys
 from pathlib import Path
 import last_folder_helper
+from epub_book import EpubBook
 
 print_if_none = False
 min_size = 1024
+FORMAT_SETTINGS = ('print_if_none', 'min_size')
+
+def check_book(book):
+    try:
+        png_files = []
+        for name in book.index:
+            if name.lower().endswith('.png'):
+                png_files.append(name)
+        total_size = sum(book.index.getinfo(f).file_size for f in png_files)
+        return len(png_files), total_size / 1024, None
+    except Exception as e:
+        return None, None, str(e)
+
+def format_book(epub_path, result):
+    png_count, size_kb, error = result
+    if error is not None:
+        return [f"{epub_path.stem}: failed to process ({error})"]
+    if png_count:
+        if size_kb > min_size:
+            return [f"{epub_path.stem[:30]:30} contains {png_count} PNGs, {size_kb:.1f}KB total"]
+    elif print_if_none:
+        return [f"{epub_path.stem} contains no PNGs"]
+    return []
 
 def main(folder):
     p = Path(folder).expanduser().resolve()
@@ -15,24 +39,15 @@ def main(folder):
         print("No EPUB files")
         return
     for epub_path in epub_paths:
-        try:
-            with zipfile.ZipFile(epub_path) as z:
-                png_files = []
-                for info in z.infolist():
-                    if info.filename.lower().endswith('.png'):
-                        png_files.append(info.filename)
-                has_png = len(png_files) > 0
-                if has_png:
-                    total_size = sum(z.getinfo(f).file_size for f in png_files)
-                    size_kb = total_size / 1024
-                    if size_kb > min_size:
-                        print(f"{epub_path.stem[:30]:30} contains {len(png_files) if len(png_files) else 'N/A'} PNGs, {size_kb:.1f}KB total" if size_kb else "")
-                else:
-                    if print_if_none: print(f"{epub_path.stem} contains no PNGs")
-        except Exception as e:
-            print(f"{epub_path.stem}: failed to process ({e})")
+        with EpubBook(epub_path) as book:
+            result = check_book(book)
+        for line in format_book(epub_path, result):
+            print(line)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 or not sys.stdin.isatty():
+        import batch_cli
+        sys.exit(batch_cli.main(sys.argv[1:], ['contains_png']))
     default = last_folder_helper.get_last_folder()
     user_input = input(f'Input folder ({default}): ').strip()
     folder = user_input or default
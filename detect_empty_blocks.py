@@ -1,60 +1,23 @@
-from zipfile import ZipFile
-from pathlib import Path, PurePosixPath
+import sys
+from pathlib import Path
 from lxml import etree
 import last_folder_helper
-from complex_scan import find_opf_path
+from epub_book import EpubBook
+from phase_timing import phase
+from doc_pool import map_documents
 
 TABLE_TAGS = {'table', 'tbody', 'thead', 'tfoot', 'tr', 'td', 'th'}
 MIN_BLOCKS = 20
 MIN_EMPTY_RUNS = 5
 EMPTY_RUNS_RATIO_THRESHOLD = 0.25
 printKeyError = False
-
-def parse_opf(z, opf_path):
-    with z.open(opf_path) as f:
-        parser = etree.XMLParser(recover=True)
-        tree = etree.parse(f, parser)
-        root = tree.getroot()
-        opf_ns = 'http://www.idpf.org/2007/opf'
-        if root.nsmap:
-            for prefix, ns in root.nsmap.items():
-                if ns and ns.endswith('/opf'):
-                    opf_ns = ns
-                    break
-        ns = {'opf': opf_ns}
-        manifest = {}
-        manifest_el = root.find('opf:manifest', ns)
-        if manifest_el is not None:
-            for item in manifest_el.findall('opf:item', ns):
-                iid = item.get('id')
-                href = item.get('href')
-                media = item.get('media-type')
-                props = item.get('properties') or ''
-                if iid and href:
-                    manifest[iid] = {'href': href, 'media-type': media, 'properties': props}
-        spine = []
-        spine_el = root.find('opf:spine', ns)
-        if spine_el is not None:
-            for itemref in spine_el.findall('opf:itemref', ns):
-                idref = itemref.get('idref')
-                if idref:
-                    spine.append(idref)
-        opf_dir = PurePosixPath(opf_path).parent.as_posix()
-        return manifest, spine, opf_dir
-
-def resolve_href(opf_dir, href):
-    clean_href = PurePosixPath(href)
-    if '..' in clean_href.parts:
-        print(f"Warning: Skipping path with '..' components: {href}")
-        return None
-    if not opf_dir:
-        return clean_href.as_posix()
-    return (PurePosixPath(opf_dir) / clean_href).as_posix()
+doc_threads = 0
 
 def analyze_blocks_in_html_bytes(html_bytes):
     try:
         parser = etree.HTMLParser(recover=True)
-        tree = etree.fromstring(html_bytes, parser)
+        with phase('lxml_parse'):
+            tree = etree.fromstring(html_bytes, parser)
     except Exception as e:
         print(f"Warning: Error parsing HTML: {e}")
         return {'total': 0, 'empty': 0, 'empty_block_count_in_long_runs': 0, 'link_blocks': 0, 'is_toc_like': False}
@@ -97,52 +60,69 @@ def analyze_blocks_in_html_bytes(html_bytes):
     is_toc_like = (link_blocks / total) > 0.3
     return {'total': total, 'empty': empty, 'empty_block_count_in_long_runs': empty_block_count_in_long_runs, 'link_blocks': link_blocks, 'is_toc_like': is_toc_like}
 
-def analyze_epub_empty_blocks(epub_path, min_blocks=MIN_BLOCKS):
+def read_and_analyze(book, sf):
+    data = book.read(sf)
+    try:
+        return analyze_blocks_in_html_bytes(data), None
+    except Exception as e:
+        return None, e
+
+def analyze_epub_empty_blocks(epub_path, min_blocks=None):
+    with EpubBook(epub_path) as book:
+        return check_book(book, min_blocks=min_blocks)
+
+def check_book(book, min_blocks=None):
+    if min_blocks is None:
+        min_blocks = MIN_BLOCKS
+    epub_path = book.path
     findings = []
     try:
-        with ZipFile(epub_path, 'r') as z:
-            opf_path = find_opf_path(z)
-            if not opf_path:
-                print(f"Warning: No OPF file found in {epub_path}")
-                return findings
+        if not book.opf_path:
+            print(f"Warning: No OPF file found in {epub_path}")
+            return findings
+        try:
+            spine_items = book.spine_items
+        except Exception as e:
+            print(f"Warning: Error parsing OPF in {epub_path}: {e}")
+            return findings
+        spine_files = []
+        for item in spine_items:
+            href = item.path
+            media_type = item.media_type or ''
+            if media_type in ('application/xhtml+xml', 'text/html') or href.lower().endswith(('.xhtml', '.html', '.htm')):
+                spine_files.append(href)
+        for sf, job in map_documents(lambda sf: read_and_analyze(book, sf), spine_files, doc_threads):
             try:
-                manifest, spine, opf_dir = parse_opf(z, opf_path)
+                stats, error = job.result()
+            except KeyError:
+                if printKeyError: print(f"Warning: File not found in archive: {sf}")
+                continue
             except Exception as e:
-                print(f"Warning: Error parsing OPF in {epub_path}: {e}")
-                return findings
-            spine_files = []
-            for idref in spine:
-                item = manifest.get(idref)
-                if not item:
-                    continue
-                href = resolve_href(opf_dir, item['href'])
-                if href is None:
-                    continue
-                media_type = item.get('media-type', '')
-                if media_type in ('application/xhtml+xml', 'text/html') or href.lower().endswith(('.xhtml', '.html', '.htm')):
-                    spine_files.append(href)
-            for sf in spine_files:
-                try:
-                    with z.open(sf) as fh:
-                        data = fh.read()
-                except KeyError:
-                    if printKeyError: print(f"Warning: File not found in archive: {sf}")
-                    continue
-                except Exception as e:
-                    print(f"Warning: Error reading {sf}: {e}")
-                    continue
-                stats = analyze_blocks_in_html_bytes(data)
-                if stats['total'] < min_blocks:
-                    continue
-                if stats['is_toc_like']:
-                    continue
-                if stats['empty_block_count_in_long_runs'] >= MIN_EMPTY_RUNS and (stats['empty_block_count_in_long_runs'] / stats['total']) > EMPTY_RUNS_RATIO_THRESHOLD:
-                    findings.append((sf, stats))
+                print(f"Warning: Error reading {sf}: {e}")
+                continue
+            if error is not None:
+                raise error
+            if stats['total'] < min_blocks:
+                continue
+            if stats['is_toc_like']:
+                continue
+            if stats['empty_block_count_in_long_runs'] >= MIN_EMPTY_RUNS and (stats['empty_block_count_in_long_runs'] / stats['total']) > EMPTY_RUNS_RATIO_THRESHOLD:
+                findings.append((sf, stats))
     except Exception as e:
         print(f"Warning: Error processing {epub_path}: {e}")
         return findings
     return findings
 
+def format_book(epub, results):
+    if not results:
+        return []
+    worst_sf, worst_stats = max(results, key=lambda x: x[1].get('empty_block_count_in_long_runs', 0) / x[1].get('total', 1))
+    total = worst_stats.get('total', 0)
+    empty = worst_stats.get('empty', 0)
+    empty_block_count = worst_stats.get('empty_block_count_in_long_runs', 0)
+    ratio = (empty_block_count / total) if total else 0.0
+    return [f"{epub.stem}: {len(results)} spine files exceed threshold, worst {worst_sf} ratio={ratio:.2f}"]
+
 def main(folder):
     p = Path(folder).expanduser().resolve()
     if not p.is_dir():
@@ -158,16 +138,13 @@ def main(folder):
         except Exception as e:
             print(f"Error analyzing {epub.name}: {e}")
             continue
-        if not results:
-            continue
-        worst_sf, worst_stats = max(results, key=lambda x: x[1].get('empty_block_count_in_long_runs', 0) / x[1].get('total', 1))
-        total = worst_stats.get('total', 0)
-        empty = worst_stats.get('empty', 0)
-        empty_block_count = worst_stats.get('empty_block_count_in_long_runs', 0)
-        ratio = (empty_block_count / total) if total else 0.0
-        print(f"{epub.stem}: {len(results)} spine files exceed threshold, worst {worst_sf} ratio={ratio:.2f}")
+        for line in format_book(epub, results):
+            print(line)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 or not sys.stdin.isatty():
+        import batch_cli
+        sys.exit(batch_cli.main(sys.argv[1:], ['detect_empty_blocks']))
     default = last_folder_helper.get_last_folder()
     user_input = input(f'Input folder ({default}): ').strip()
     folder = user_input or default
@@ -0,0 +1,182 @@
+import sys
+import argparse
+from pathlib import Path
+from lxml import etree
+from epub_book import EpubBook
+from heavy_hitters import CountMinSketch, TopK, hash64
+from search_strings import SEARCH_STRINGS, stream_chunk_size
+from batch_cli import prompt_root
+
+DC_NS = 'http://purl.org/dc/elements/1.1/'
+BLOCK_TAGS = frozenset(['p', 'div', 'br', 'hr', 'li', 'ul', 'ol', 'dt', 'dd', 'td', 'th', 'tr', 'table', 'caption',
+                        'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'section', 'article', 'aside',
+                        'header', 'footer', 'nav', 'figure', 'figcaption', 'title', 'body', 'head', 'html',
+                        'navpoint', 'navlabel', 'text', 'doctitle', 'docauthor'])
+SKIP_TAGS = frozenset(['script', 'style'])
+DOCUMENT_TYPES = frozenset(['application/xhtml+xml', 'text/html', 'image/svg+xml', 'application/x-dtbncx+xml'])
+sketch_width = 1 << 19
+sketch_depth = 4
+top_k = 200
+min_line_chars = 6
+max_line_chars = 160
+min_line_letters = 4
+max_lines_per_book = 20000
+min_unrelated = 3
+report_limit = 50
+
+def normalize_line(text):
+    line = ' '.join(text.split()).lower()
+    if not min_line_chars <= len(line) <= max_line_chars:
+        return None
+    if sum(ch.isalpha() for ch in line) < min_line_letters:
+        return None
+    return line
+
+class LineTarget:
+    def __init__(self, lines):
+        self.lines = lines
+        self.parts = []
+        self.skipping = 0
+
+    def flush(self):
+        if self.parts:
+            line = normalize_line(''.join(self.parts))
+            self.parts = []
+            if line is not None and len(self.lines) < max_lines_per_book:
+                self.lines.setdefault(hash64(line), line)
+
+    def start(self, tag, attrib):
+        if tag in SKIP_TAGS:
+            self.skipping += 1
+        elif tag in BLOCK_TAGS:
+            self.flush()
+
+    def end(self, tag):
+        if tag in SKIP_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in BLOCK_TAGS:
+            self.flush()
+
+    def data(self, text):
+        if not self.skipping:
+            self.parts.append(text)
+
+    def close(self):
+        self.flush()
+        return self.lines
+
+def book_lines(book):
+    lines = {}
+    if not book.opf_path:
+        return lines
+    documents = [item.path for item in book.manifest.values() if (item.media_type or '').lower() in DOCUMENT_TYPES]
+    for cf in documents:
+        try:
+            parser = etree.HTMLParser(target=LineTarget(lines), recover=True)
+            with book.open(cf) as f:
+                while True:
+                    chunk = f.read(stream_chunk_size)
+                    if not chunk:
+                        break
+                    parser.feed(chunk)
+            parser.close()
+        except Exception:
+            continue
+        if len(lines) >= max_lines_per_book:
+            break
+    return lines
+
+def book_creator(book):
+    try:
+        for el in book.opf_root.iter(f'{{{DC_NS}}}creator'):
+            name = ' '.join((el.text or '').split()).lower()
+            if name:
+                return name
+    except Exception:
+        pass
+    return None
+
+class LineDiscovery:
+    def __init__(self):
+        self.books = CountMinSketch(sketch_width, sketch_depth)
+        self.unrelated = CountMinSketch(sketch_width, sketch_depth)
+        self.pairs = CountMinSketch(sketch_width, sketch_depth)
+        self.top = TopK(top_k)
+        self.book_count = 0
+
+    @property
+    def nbytes(self):
+        return self.books.nbytes + self.unrelated.nbytes + self.pairs.nbytes
+
+    def add_book(self, lines, group):
+        self.book_count += 1
+        for key, line in lines.items():
+            books = self.books.add(key)
+            pair = hash64(f'{key}:{group}')
+            if self.pairs.estimate(pair) == 0:
+                self.pairs.add(pair)
+                unrelated = self.unrelated.add(key)
+            else:
+                unrelated = self.unrelated.estimate(key)
+            self.top.offer(key, unrelated, (books, line))
+
+    def candidates(self):
+        return [(unrelated, books, line) for key, (unrelated, (books, line)) in self.top.ranked()
+                if unrelated >= min_unrelated]
+
+def is_known(line):
+    return any(term.lower() in line for term in SEARCH_STRINGS)
+
+def main(folder):
+    p = Path(folder).expanduser().resolve()
+    if not p.is_dir():
+        print(f"Folder not found: {p}")
+        return
+    epub_paths = sorted(p.rglob('*.epub'))
+    if not epub_paths:
+        print("No EPUB files found")
+        return
+    discovery = LineDiscovery()
+    for epub_path in epub_paths:
+        try:
+            with EpubBook(str(epub_path)) as book:
+                lines = book_lines(book)
+                group = book_creator(book) or str(epub_path)
+        except Exception as e:
+            print(f"Error processing {epub_path.name}: {e}")
+            continue
+        discovery.add_book(lines, group)
+    candidates = discovery.candidates()
+    print(f"Scanned {discovery.book_count} books with {discovery.nbytes / (1024 * 1024):.1f}MB of sketches")
+    if not candidates:
+        print(f"No lines found in at least {min_unrelated} unrelated books")
+        return
+    print(f"{'authors':>7} {'books':>6}  line")
+    for unrelated, books, line in candidates[:report_limit]:
+        marker = "  [known]" if is_known(line) else ""
+        print(f"{unrelated:>7} {books:>6}  {line}{marker}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Find lines repeated across books by unrelated authors.')
+    parser.add_argument('folder', nargs='?', help='library folder to scan')
+    parser.add_argument('--min-unrelated', type=int, default=min_unrelated, metavar='N',
+                        help='report lines found in books by at least N unrelated authors')
+    parser.add_argument('--top-k', type=int, default=top_k, metavar='N', help='candidate lines to track')
+    parser.add_argument('--limit', type=int, default=report_limit, metavar='N', help='lines to report')
+    return parser
+
+def run(argv=None):
+    global min_unrelated, top_k, report_limit
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.folder is not None:
+        folder = Path(args.folder)
+    elif sys.stdin.isatty():
+        folder = prompt_root()
+    else:
+        parser.error('no input: give a library folder')
+    min_unrelated, top_k, report_limit = args.min_unrelated, args.top_k, args.limit
+    main(folder)
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
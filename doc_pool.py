@@ -0,0 +1,52 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+import phase_timing
+
+queue_per_thread = 2
+min_documents = 8
+
+_executor = None
+_executor_key = None
+
+class Deferred:
+    __slots__ = ('fn', 'item')
+
+    def __init__(self, fn, item):
+        self.fn = fn
+        self.item = item
+
+    def result(self):
+        return self.fn(self.item)
+
+def executor(threads):
+    global _executor, _executor_key
+    key = (os.getpid(), threads)
+    if _executor_key != key:
+        if _executor is not None and _executor_key[0] == key[0]:
+            _executor.shutdown(wait=False)
+        _executor = ThreadPoolExecutor(threads, thread_name_prefix='doc_pool')
+        _executor_key = key
+    return _executor
+
+def map_documents(fn, items, threads=0):
+    items = list(items)
+    if threads <= 0 or len(items) < min_documents:
+        for item in items:
+            yield item, Deferred(fn, item)
+        return
+    pool = executor(threads)
+    run = phase_timing.bind(fn)
+    depth = threads * queue_per_thread
+    pending = deque()
+    try:
+        for item in items:
+            pending.append((item, pool.submit(run, item)))
+            if len(pending) >= depth:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        wait([future for _, future in pending])
@@ -0,0 +1,77 @@
+from lxml import etree
+from epub_book import resource_limit_error
+from phase_timing import phase
+
+stream_chunk_size = 64 * 1024
+
+HEADING_TAGS = frozenset(('h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+
+class DocumentSummary:
+    __slots__ = ('stop_at_heading', 'depth', 'body_depth', 'closed', 'stopped', 'headings', 'limit_error')
+
+    def __init__(self, stop_at_heading=False):
+        self.stop_at_heading = stop_at_heading
+        self.depth = 0
+        self.body_depth = None
+        self.closed = False
+        self.stopped = False
+        self.headings = 0
+        self.limit_error = None
+
+    @property
+    def has_body(self):
+        return self.body_depth is not None
+
+    def start(self, tag, attrib):
+        self.depth += 1
+        if self.closed:
+            return
+        if self.body_depth is None:
+            if tag == 'body':
+                self.body_depth = self.depth
+            return
+        if tag in HEADING_TAGS:
+            self.headings += 1
+            if self.stop_at_heading:
+                self.stopped = True
+
+    def end(self, tag):
+        if self.depth == self.body_depth or self.depth == 1:
+            self.closed = True
+            self.stopped = True
+        self.depth -= 1
+
+    def close(self):
+        return self
+
+def summarize_stream(f, stop_at_heading=False):
+    summary = DocumentSummary(stop_at_heading)
+    parser = etree.HTMLParser(target=summary, recover=True)
+    with phase('lxml_parse'):
+        while not summary.stopped:
+            chunk = f.read(stream_chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+        if not summary.stopped:
+            parser.close()
+    summary.limit_error = resource_limit_error(parser.error_log)
+    return summary
+
+def summarize_member(book, name, stop_at_heading=False):
+    try:
+        with book.open(name) as f:
+            return summarize_stream(f, stop_at_heading)
+    except Exception:
+        return None
+
+def use_stream(book, name, min_size):
+    if min_size is None:
+        return False
+    try:
+        if book.info(name).file_size >= min_size:
+            return True
+        book.html_root(name)
+    except Exception:
+        return False
+    return book.parse_limit(name) is not None
@@ -0,0 +1,452 @@
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from zipfile import ZipFile
+from pathlib import PurePosixPath
+from urllib.parse import unquote
+from lxml import etree
+from phase_timing import phase, timed_stream
+
+OPF_NS = 'http://www.idpf.org/2007/opf'
+NCX_MEDIA_TYPE = 'application/x-dtbncx+xml'
+COVER_IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif')
+
+cache_budget = 32 * 1024 * 1024
+tree_weight = 3
+
+def find_opf_path(z):
+    try:
+        with z.open('META-INF/container.xml') as f:
+            tree = etree.parse(f)
+            rootfile = tree.find('.//{urn:oasis:names:tc:opendocument:xmlns:container}rootfile')
+            if rootfile is not None:
+                return rootfile.get('full-path')
+    except Exception as e:
+        print(f"Warning: Error reading container.xml: {e}")
+    for name in z.namelist():
+        if name.lower().endswith('.opf'):
+            return name
+    return None
+
+def resource_limit_error(error_log):
+    for entry in error_log.filter_types((etree.ErrorTypes.ERR_RESOURCE_LIMIT,)):
+        return entry.message.strip()
+    return None
+
+def resolve_href(opf_dir, href):
+    decoded_href = unquote(href)
+    if not opf_dir:
+        return PurePosixPath(decoded_href).as_posix()
+    return (PurePosixPath(opf_dir) / PurePosixPath(decoded_href)).as_posix()
+
+def normalize_member(path):
+    parts = []
+    for part in unquote(path).replace('\\', '/').split('/'):
+        if part == '..':
+            if parts:
+                parts.pop()
+        elif part and part != '.':
+            parts.append(part)
+    return '/'.join(parts)
+
+class ArchiveIndex:
+    __slots__ = ('names', 'infos', 'folded')
+
+    def __init__(self, infolist):
+        self.names = []
+        self.infos = {}
+        self.folded = {}
+        for info in infolist:
+            name = info.filename
+            self.names.append(name)
+            self.infos[name] = info
+            self.folded.setdefault(normalize_member(name).lower(), name)
+
+    def __contains__(self, name):
+        return name in self.infos
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def getinfo(self, name):
+        return self.infos[name]
+
+    def resolve(self, path):
+        if path is None:
+            return None
+        if path in self.infos:
+            return path
+        return self.folded.get(normalize_member(path).lower())
+
+class ManifestItem:
+    __slots__ = ('id', 'href', 'media_type', 'properties', 'path')
+
+    def __init__(self, id, href, media_type, properties, path):
+        self.id = id
+        self.href = href
+        self.media_type = media_type
+        self.properties = properties
+        self.path = path
+
+    def has_property(self, name):
+        return name in self.properties.split()
+
+class SpineRef:
+    __slots__ = ('idref', 'linear')
+
+    def __init__(self, idref, linear):
+        self.idref = idref
+        self.linear = linear
+
+class MemberCache:
+    __slots__ = ('budget', 'entries', 'size', 'pinned', 'pinned_names', 'lock')
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.size = 0
+        self.pinned = {}
+        self.pinned_names = set()
+        self.lock = threading.Lock()
+
+    def pin(self, names):
+        with self.lock:
+            for name in names:
+                if name is None or name in self.pinned_names:
+                    continue
+                self.pinned_names.add(name)
+                for key in [key for key in self.entries if key[1] == name]:
+                    value, cost = self.entries.pop(key)
+                    self.size -= cost
+                    self.pinned[key] = value
+
+    def get(self, key):
+        with self.lock:
+            value = self.pinned.get(key)
+            if value is not None:
+                return value
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, cost):
+        with self.lock:
+            if key[1] in self.pinned_names:
+                self.pinned[key] = value
+                return
+            if cost > self.budget or key in self.entries:
+                return
+            self.entries[key] = (value, cost)
+            self.size += cost
+            while self.size > self.budget:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.pinned.clear()
+            self.pinned_names.clear()
+            self.size = 0
+
+_UNSET = object()
+
+class EpubBook:
+    __slots__ = ('path', 'source', '_z', '_index', '_opf_path', '_opf_root', '_ns', '_manifest', '_href_to_id', '_by_media_type',
+                 '_spine', '_spine_toc', '_spine_items', '_cover', '_cache', '_parse_limits')
+
+    def __init__(self, path, source=None):
+        self.path = path
+        self.source = source
+        self._z = None
+        self._index = None
+        self._opf_path = _UNSET
+        self._opf_root = None
+        self._ns = None
+        self._manifest = None
+        self._href_to_id = None
+        self._by_media_type = None
+        self._spine = None
+        self._spine_toc = None
+        self._spine_items = None
+        self._cover = None
+        self._cache = MemberCache(cache_budget)
+        self._parse_limits = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._z is not None:
+            self._z.close()
+            self._z = None
+        self._index = None
+        self._cache.clear()
+        self._parse_limits.clear()
+
+    @property
+    def z(self):
+        if self._z is None:
+            with phase('zip_open'):
+                self._z = ZipFile(self.path if self.source is None else self.source, 'r')
+        return self._z
+
+    @property
+    def index(self):
+        if self._index is None:
+            z = self.z
+            with phase('zip_open'):
+                self._index = ArchiveIndex(z.infolist())
+        return self._index
+
+    def resolve(self, path):
+        return self.index.resolve(path)
+
+    def resolve_link(self, source_path, href):
+        target = href.split('#', 1)[0]
+        base = PurePosixPath(source_path).parent.as_posix() if source_path else ''
+        path = normalize_member(f'{base}/{target}' if base else target)
+        return self.resolve(path) or path
+
+    @property
+    def opf_path(self):
+        if self._opf_path is _UNSET:
+            z = self.z
+            with phase('find_opf'):
+                opf_path = find_opf_path(z)
+                self._opf_path = self.resolve(opf_path) or opf_path
+            self._cache.pin((self._opf_path,))
+        return self._opf_path
+
+    @property
+    def opf_root(self):
+        if self._opf_root is None:
+            opf_path = self.opf_path
+            root = self._cache.get(('xml', opf_path))
+            if root is None:
+                data = self.read(opf_path)
+                with phase('opf_parse'):
+                    root = etree.fromstring(data, etree.XMLParser(recover=True))
+                self._cache.put(('xml', opf_path), root, len(data) * tree_weight)
+            self._opf_root = root
+        return self._opf_root
+
+    @property
+    def opf_dir(self):
+        return PurePosixPath(self.opf_path).parent.as_posix()
+
+    @property
+    def ns(self):
+        if self._ns is None:
+            opf_ns = OPF_NS
+            for uri in (self.opf_root.nsmap or {}).values():
+                if uri and 'opf' in uri:
+                    opf_ns = uri
+                    break
+            self._ns = {'opf': opf_ns}
+        return self._ns
+
+    @property
+    def version(self):
+        return self.opf_root.get('version') or ''
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._parse_manifest()
+        return self._manifest
+
+    @property
+    def href_to_id(self):
+        if self._href_to_id is None:
+            self._parse_manifest()
+        return self._href_to_id
+
+    @property
+    def items_by_media_type(self):
+        if self._by_media_type is None:
+            self._parse_manifest()
+        return self._by_media_type
+
+    def _parse_manifest(self):
+        opf_root = self.opf_root
+        with phase('opf_parse'):
+            self._parse_manifest_entries(opf_root)
+
+    def _parse_manifest_entries(self, opf_root):
+        manifest = {}
+        href_to_id = {}
+        by_media_type = {}
+        opf_dir = self.opf_dir
+        index = self.index
+        manifest_el = opf_root.find('opf:manifest', self.ns)
+        if manifest_el is not None:
+            for el in manifest_el.findall('opf:item', self.ns):
+                iid = el.get('id')
+                href = el.get('href')
+                if not (iid and href):
+                    continue
+                path = resolve_href(opf_dir, href)
+                item = ManifestItem(iid, href, el.get('media-type'), el.get('properties') or '', index.resolve(path) or path)
+                manifest[iid] = item
+                href_to_id.setdefault(href, iid)
+                by_media_type.setdefault(item.media_type or '', []).append(item)
+        self._manifest = manifest
+        self._href_to_id = href_to_id
+        self._by_media_type = by_media_type
+        self._cache.pin(item.path for item in manifest.values()
+                        if item.has_property('nav') or item.media_type == NCX_MEDIA_TYPE)
+
+    @property
+    def spine(self):
+        if self._spine is None:
+            self._parse_spine()
+        return self._spine
+
+    @property
+    def spine_toc(self):
+        if self._spine is None:
+            self._parse_spine()
+        return self._spine_toc
+
+    def _parse_spine(self):
+        opf_root = self.opf_root
+        with phase('opf_parse'):
+            self._parse_spine_entries(opf_root)
+
+    def _parse_spine_entries(self, opf_root):
+        spine = []
+        spine_toc = None
+        spine_el = opf_root.find('opf:spine', self.ns)
+        if spine_el is not None:
+            spine_toc = spine_el.get('toc')
+            for el in spine_el.findall('opf:itemref', self.ns):
+                idref = el.get('idref')
+                if idref:
+                    spine.append(SpineRef(idref, el.get('linear', 'yes')))
+        self._spine = spine
+        self._spine_toc = spine_toc
+
+    @property
+    def spine_items(self):
+        if self._spine_items is None:
+            manifest = self.manifest
+            self._spine_items = [manifest[ref.idref] for ref in self.spine if ref.idref in manifest]
+        return self._spine_items
+
+    @property
+    def spine_paths(self):
+        return [item.path for item in self.spine_items]
+
+    @property
+    def nav_items(self):
+        return [item for item in self.manifest.values() if item.has_property('nav')]
+
+    @property
+    def ncx_item(self):
+        spine_toc = self.spine_toc
+        if spine_toc and spine_toc in self.manifest:
+            return self.manifest[spine_toc]
+        ncx_items = self.items_by_media_type.get(NCX_MEDIA_TYPE)
+        return ncx_items[0] if ncx_items else None
+
+    @property
+    def cover_path(self):
+        return self._find_cover()[0]
+
+    @property
+    def cover_media_type(self):
+        return self._find_cover()[1]
+
+    def _find_cover(self):
+        if self._cover is None:
+            self._cover = self._locate_cover()
+        return self._cover
+
+    def _locate_cover(self):
+        if self.version.startswith('3'):
+            for item in self.manifest.values():
+                if item.has_property('cover-image'):
+                    return item.path, item.media_type
+        meta_cover = self.opf_root.find('.//opf:meta[@name="cover"]', self.ns)
+        if meta_cover is not None:
+            cid = meta_cover.get('content')
+            if cid and cid in self.manifest:
+                item = self.manifest[cid]
+                return item.path, item.media_type
+        guide = self.opf_root.find('opf:guide', self.ns)
+        if guide is not None:
+            for ref in guide.findall('opf:reference', self.ns):
+                if ref.get('type') == 'cover':
+                    href = ref.get('href')
+                    if href:
+                        path = resolve_href(self.opf_dir, href.split('#')[0])
+                        return self.resolve(path) or path, None
+        candidates = []
+        for name in self.index.names:
+            p = PurePosixPath(name)
+            if p.suffix.lower() in COVER_IMAGE_SUFFIXES and p.name.lower().startswith('cover.'):
+                candidates.append(name)
+        if candidates:
+            candidates.sort(key=len)
+            return candidates[0], None
+        return None, None
+
+    def info(self, name):
+        member = self.resolve(name)
+        if member is None:
+            raise KeyError(f"There is no item named {name!r} in the archive")
+        return self.index.getinfo(member)
+
+    def open(self, name):
+        data = self._cache.get(('data', name))
+        if data is not None:
+            return BytesIO(data)
+        return timed_stream(self.z.open(self.info(name)))
+
+    def read(self, name):
+        data = self._cache.get(('data', name))
+        if data is None:
+            info = self.info(name)
+            member = getattr(self.source, 'member', None)
+            with phase('decompress') as p:
+                data = member(info) if member is not None else None
+                if data is None:
+                    with self.z.open(info) as f:
+                        data = f.read()
+                p.add_bytes(len(data))
+            self._cache.put(('data', name), data, len(data))
+        return data
+
+    def html_root(self, name):
+        root = self._cache.get(('html', name))
+        if root is None:
+            data = self.read(name)
+            parser = etree.HTMLParser(recover=True)
+            with phase('lxml_parse'):
+                root = etree.fromstring(data, parser)
+            limit = resource_limit_error(parser.error_log)
+            if limit is not None:
+                self._parse_limits[name] = limit
+            self._cache.put(('html', name), root, len(data) * tree_weight)
+        return root
+
+    def parse_limit(self, name):
+        return self._parse_limits.get(name)
+
+    def xml_root(self, name):
+        root = self._cache.get(('xml', name))
+        if root is None:
+            data = self.read(name)
+            with phase('lxml_parse'):
+                root = etree.fromstring(data, etree.XMLParser(recover=True))
+            self._cache.put(('xml', name), root, len(data) * tree_weight)
+        return root
@@ -1,44 +1,48 @@
 import sys
 from pathlib import Path
-from zipfile import ZipFile
-from lxml import etree
 import last_folder_helper
-from complex_scan import find_opf_path
+from epub_book import EpubBook
 
 print_classification = False
+FORMAT_SETTINGS = ('print_classification',)
 
-def get_package_version(z, opf_path):
+def get_package_version(book):
     try:
-        with z.open(opf_path) as f:
-            parser = etree.XMLParser(recover=True)
-            tree = etree.parse(f, parser)
-            root = tree.getroot()
-            tag_name = root.tag.split('}')[-1] if '}' in root.tag else root.tag
-            if tag_name == 'package':
-                return root.get('version')
+        root = book.opf_root
+        tag_name = root.tag.split('}')[-1] if '}' in root.tag else root.tag
+        if tag_name == 'package':
+            return root.get('version')
     except Exception:
         pass
     return None
 
 def classify_epub(path):
+    with EpubBook(path) as book:
+        return check_book(book)
+
+def check_book(book):
     try:
-        with ZipFile(path, 'r') as z:
-            opf_path = find_opf_path(z)
-            if opf_path is None:
-                return "weird (no OPF file found)"
-            version = get_package_version(z, opf_path)
-            if version:
-                version = version.strip()
-                if version.startswith("3."):
-                    return f"EPUB 3 (version {version})"
-                elif version in ("2.0", "2.0.1"):
-                    return f"EPUB 2 (version {version})"
-                else:
-                    return f"weird (unusual version {version})"
-            return "weird (missing version attribute or invalid package element)"
+        if book.opf_path is None:
+            return "weird (no OPF file found)"
+        version = get_package_version(book)
+        if version:
+            version = version.strip()
+            if version.startswith("3."):
+                return f"EPUB 3 (version {version})"
+            elif version in ("2.0", "2.0.1"):
+                return f"EPUB 2 (version {version})"
+            else:
+                return f"weird (unusual version {version})"
+        return "weird (missing version attribute or invalid package element)"
     except Exception:
         return "weird (cannot open ZIP or serious parsing error)"
 
+def format_book(epub, classification):
+    if not classification.startswith("EPUB 2"):
+        classification = " " + classification
+        return [f'{epub.stem}{classification if print_classification else ""}']
+    return []
+
 def main(folder):
     p = Path(folder).expanduser().resolve()
     if not p.is_dir():
@@ -50,12 +54,13 @@ def main(folder):
         return
     epub_paths.sort(key=lambda x: x.name.lower())
     for epub in epub_paths:
-        classification = classify_epub(str(epub))
-        if not classification.startswith("EPUB 2"):
-            classification = " " + classification
-            print(f'{epub.stem}{classification if print_classification else ""}')
+        for line in format_book(epub, classify_epub(str(epub))):
+            print(line)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 or not sys.stdin.isatty():
+        import batch_cli
+        sys.exit(batch_cli.main(sys.argv[1:], ['find_epub3']))
     default = last_folder_helper.get_last_folder()
     user_input = input(f'Input folder ({default}): ').strip()
     folder = user_input or default
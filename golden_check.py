@@ -0,0 +1,138 @@
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+from batch_cli import DOC_THREAD_CHECKERS, to_json
+from bench_scan import load_corpus
+import make_corpus
+from scan_engine import CHECKERS, load_checkers, iter_results
+from result_cache import checker_version
+
+diff_width = 160
+
+MODES = {
+    'reference': lambda tmp: {'search_strings': {'stream_text': False, 'prefilter': False},
+                              'complex_scan': {'stream_min_size': None}},
+    'default': lambda tmp: {},
+    'indexed': lambda tmp: {'search_strings': {'index_path': str(Path(tmp) / 'text_index.db')}},
+    'streaming': lambda tmp: {'complex_scan': {'stream_min_size': 0}},
+    'threaded': lambda tmp: {name: {'doc_threads': 4} for name in DOC_THREAD_CHECKERS},
+}
+
+def corpus_fingerprint(root, epub_paths):
+    h = hashlib.sha1()
+    for path in epub_paths:
+        h.update(f"{path.relative_to(root)}\0{path.stat().st_size}\0".encode())
+    return h.hexdigest()[:16]
+
+@contextlib.contextmanager
+def overridden(checkers, overrides):
+    saved = []
+    for name, module in checkers:
+        for attr, value in overrides.get(name, {}).items():
+            saved.append((module, attr, getattr(module, attr)))
+            setattr(module, attr, value)
+    try:
+        yield
+    finally:
+        for module, attr, value in reversed(saved):
+            setattr(module, attr, value)
+
+def run_mode(root, epub_paths, names, mode, jobs):
+    checkers = load_checkers(names)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        overrides = MODES[mode](tmp)
+        with overridden(checkers, overrides):
+            for epub_path, scanned in iter_results(epub_paths, checkers, jobs, overrides):
+                key = str(Path(epub_path).relative_to(root))
+                for name, (result, error) in scanned.items():
+                    results[(key, name)] = {'result': to_json(result), 'error': error}
+    versions = {name: checker_version(module) for name, module in checkers}
+    return results, versions
+
+def write_golden(golden_path, header, results):
+    with open(golden_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(dict(header, type='header'), sort_keys=True) + '\n')
+        for (path, name), entry in sorted(results.items()):
+            f.write(json.dumps({'type': 'result', 'path': path, 'checker': name, **entry},
+                               ensure_ascii=False, sort_keys=True) + '\n')
+
+def read_golden(golden_path):
+    header = {}
+    results = {}
+    with open(golden_path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get('type') == 'header':
+                header = record
+            else:
+                results[(record['path'], record['checker'])] = {'result': record['result'], 'error': record['error']}
+    return header, results
+
+def shorten(value):
+    text = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return text if len(text) <= diff_width else text[:diff_width - 3] + '...'
+
+def compare(golden, candidate, names):
+    differences = []
+    for key in sorted(set(golden) | set(candidate)):
+        if key[1] not in names:
+            continue
+        expected = golden.get(key)
+        actual = candidate.get(key)
+        if expected != actual:
+            differences.append((key, expected, actual))
+    return differences
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that a candidate mode reproduces stored golden results.')
+    parser.add_argument('action', choices=('record', 'compare'))
+    parser.add_argument('corpus', nargs='?', default=None, help='corpus folder (generated if missing or empty)')
+    parser.add_argument('--books', type=int, default=make_corpus.books)
+    parser.add_argument('--seed', type=int, default=make_corpus.seed)
+    parser.add_argument('--mode', choices=sorted(MODES), default=None,
+                        help="mode to run (record: 'reference', compare: 'default')")
+    parser.add_argument('--golden', metavar='JSONL', help='golden results file (default: golden_results.jsonl in the corpus)')
+    parser.add_argument('--checkers', nargs='+', default=CHECKERS, choices=CHECKERS, metavar='NAME')
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--limit', type=int, default=50, help='differences to print')
+    args = parser.parse_args(argv)
+    root, epub_paths = load_corpus(args.corpus, args.books, args.seed)
+    root = root.resolve()
+    epub_paths = [path.resolve() for path in epub_paths]
+    golden_path = Path(args.golden) if args.golden else root / 'golden_results.jsonl'
+    fingerprint = corpus_fingerprint(root, epub_paths)
+    if args.action == 'record' or not golden_path.exists():
+        mode = args.mode if args.action == 'record' and args.mode else 'reference'
+        results, versions = run_mode(root, epub_paths, args.checkers, mode, args.jobs)
+        write_golden(golden_path, {'mode': mode, 'corpus': fingerprint, 'versions': versions}, results)
+        print(f"Recorded {len(results)} results from '{mode}' mode over {len(epub_paths)} books to {golden_path}")
+        if args.action == 'record':
+            return 0
+    header, golden = read_golden(golden_path)
+    if header.get('corpus') != fingerprint:
+        print("Warning: golden results were recorded on a different corpus")
+    mode = args.mode or 'default'
+    candidate, versions = run_mode(root, epub_paths, args.checkers, mode, args.jobs)
+    changed = sorted(name for name in args.checkers if header.get('versions', {}).get(name) not in (None, versions[name]))
+    if changed:
+        print(f"Checkers changed since the golden run: {', '.join(changed)}")
+    differences = compare(golden, candidate, set(args.checkers))
+    for (path, name), expected, actual in differences[:args.limit]:
+        print(f"{path} [{name}]")
+        print(f"  golden ({header.get('mode', '?')}): {shorten(expected)}")
+        print(f"  {mode}: {shorten(actual)}")
+    by_checker = {}
+    for (path, name), _, _ in differences:
+        by_checker[name] = by_checker.get(name, 0) + 1
+    summary = ', '.join(f"{name} {count}" for name, count in sorted(by_checker.items()))
+    print(f"'{mode}' vs golden '{header.get('mode', '?')}': {len(differences)} differing results"
+          f" over {len(epub_paths)} books" + (f" ({summary})" if summary else ''))
+    return 1 if differences else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
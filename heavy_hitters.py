@@ -0,0 +1,61 @@
+import hashlib
+from array import array
+
+def hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+class CountMinSketch:
+    __slots__ = ('width', 'depth', 'rows')
+
+    def __init__(self, width, depth):
+        self.width = width
+        self.depth = depth
+        self.rows = [array('I', bytes(4 * width)) for _ in range(depth)]
+
+    def _indexes(self, key):
+        h1 = key & 0xFFFFFFFF
+        h2 = (key >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def estimate(self, key):
+        return min(row[i] for row, i in zip(self.rows, self._indexes(key)))
+
+    def add(self, key):
+        indexes = self._indexes(key)
+        value = min(row[i] for row, i in zip(self.rows, indexes)) + 1
+        for row, i in zip(self.rows, indexes):
+            if row[i] < value:
+                row[i] = value
+        return value
+
+    @property
+    def nbytes(self):
+        return sum(row.itemsize * len(row) for row in self.rows)
+
+class TopK:
+    __slots__ = ('k', 'items', 'floor')
+
+    def __init__(self, k):
+        self.k = k
+        self.items = {}
+        self.floor = 0
+
+    def offer(self, key, score, payload):
+        items = self.items
+        if key in items:
+            items[key] = (score, payload)
+            return
+        if len(items) < self.k:
+            items[key] = (score, payload)
+            return
+        if score <= self.floor:
+            return
+        weakest = min(items, key=lambda k: items[k][0])
+        self.floor = items[weakest][0]
+        if score > self.floor:
+            del items[weakest]
+            items[key] = (score, payload)
+            self.floor = min(value[0] for value in items.values())
+
+    def ranked(self):
+        return sorted(self.items.items(), key=lambda entry: -entry[1][0])
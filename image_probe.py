@@ -0,0 +1,231 @@
+import re
+import sys
+import struct
+import argparse
+from pathlib import Path
+from epub_book import EpubBook
+
+chunk_size = 4096
+skip_chunk_size = 64 * 1024
+max_svg_header = 64 * 1024
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+SVG_ATTR_RE = re.compile(r'''([\w:.-]+)\s*=\s*("[^"]*"|'[^']*')''')
+SVG_LENGTH_RE = re.compile(r'\s*([0-9]*\.?[0-9]+)\s*(px)?\s*$')
+
+class ProbeStream:
+    __slots__ = ('f', 'buf', 'pos', 'bytes_read')
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = b''
+        self.pos = 0
+        self.bytes_read = 0
+
+    def need(self, n):
+        while len(self.buf) - self.pos < n:
+            chunk = self.f.read(max(chunk_size, n - (len(self.buf) - self.pos)))
+            if not chunk:
+                return False
+            self.bytes_read += len(chunk)
+            self.buf = self.buf[self.pos:] + chunk
+            self.pos = 0
+        return True
+
+    def peek(self, n):
+        self.need(n)
+        return self.buf[self.pos:self.pos + n]
+
+    def take(self, n):
+        if not self.need(n):
+            return None
+        data = self.buf[self.pos:self.pos + n]
+        self.pos += n
+        return data
+
+    def skip(self, n):
+        available = len(self.buf) - self.pos
+        if n <= available:
+            self.pos += n
+            return True
+        n -= available
+        self.buf = b''
+        self.pos = 0
+        while n > 0:
+            chunk = self.f.read(min(n, skip_chunk_size))
+            if not chunk:
+                return False
+            self.bytes_read += len(chunk)
+            n -= len(chunk)
+        return True
+
+def probe_png(stream):
+    header = stream.take(24)
+    if header is None or header[12:16] != b'IHDR':
+        return None, None
+    return struct.unpack('>II', header[16:24])
+
+def probe_gif(stream):
+    header = stream.take(10)
+    if header is None:
+        return None, None
+    return struct.unpack('<HH', header[6:10])
+
+def probe_webp(stream):
+    header = stream.take(30)
+    if header is None:
+        return None, None
+    kind = header[12:16]
+    if kind == b'VP8 ' and header[23:26] == b'\x9d\x01\x2a':
+        w, h = struct.unpack('<HH', header[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    if kind == b'VP8L' and header[20] == 0x2F:
+        bits = struct.unpack('<I', header[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if kind == b'VP8X':
+        w = int.from_bytes(header[24:27], 'little') + 1
+        h = int.from_bytes(header[27:30], 'little') + 1
+        return w, h
+    return None, None
+
+def probe_jpeg(stream):
+    stream.skip(2)
+    while True:
+        byte = stream.take(1)
+        if byte is None:
+            return None, None
+        if byte[0] != 0xFF:
+            continue
+        marker = stream.take(1)
+        while marker == b'\xff':
+            marker = stream.take(1)
+        if marker is None:
+            return None, None
+        marker = marker[0]
+        if marker in JPEG_STANDALONE_MARKERS or marker == 0x00:
+            continue
+        if marker in (0xD9, 0xDA):
+            return None, None
+        length_bytes = stream.take(2)
+        if length_bytes is None:
+            return None, None
+        length = struct.unpack('>H', length_bytes)[0]
+        if length < 2:
+            return None, None
+        if marker in JPEG_SOF_MARKERS:
+            sof = stream.take(5)
+            if sof is None:
+                return None, None
+            h, w = struct.unpack('>HH', sof[1:5])
+            return w, h
+        if not stream.skip(length - 2):
+            return None, None
+
+def parse_svg_length(value):
+    if not value:
+        return None
+    m = SVG_LENGTH_RE.match(value)
+    if not m:
+        return None
+    return int(round(float(m.group(1))))
+
+def probe_svg(stream):
+    while True:
+        text = stream.buf[stream.pos:]
+        start = text.find(b'<svg')
+        if start != -1:
+            end = text.find(b'>', start)
+            if end != -1:
+                break
+        if len(text) >= max_svg_header or not stream.need(len(text) + chunk_size):
+            return None, None
+    tag = text[start:end].decode('utf-8', errors='ignore')
+    attrs = {name.split(':')[-1]: value[1:-1] for name, value in SVG_ATTR_RE.findall(tag)}
+    w = parse_svg_length(attrs.get('width'))
+    h = parse_svg_length(attrs.get('height'))
+    if w is None or h is None:
+        parts = attrs.get('viewBox', '').replace(',', ' ').split()
+        if len(parts) == 4:
+            try:
+                w = int(round(float(parts[2])))
+                h = int(round(float(parts[3])))
+            except ValueError:
+                return None, None
+    return w, h
+
+def probe_image(f, vector=True):
+    stream = ProbeStream(f)
+    head = stream.peek(16)
+    w, h = None, None
+    try:
+        if head[:8] == b'\x89PNG\r\n\x1a\n':
+            w, h = probe_png(stream)
+        elif head[:2] == b'\xff\xd8':
+            w, h = probe_jpeg(stream)
+        elif head[:6] in (b'GIF87a', b'GIF89a'):
+            w, h = probe_gif(stream)
+        elif head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            w, h = probe_webp(stream)
+        elif vector and b'<' in head:
+            w, h = probe_svg(stream)
+    except (struct.error, IndexError):
+        w, h = None, None
+    if w is None or h is None:
+        return None, None, stream.bytes_read
+    return w, h, stream.bytes_read
+
+def probe_member(book, name, vector=True):
+    with book.open(name) as f:
+        return probe_image(f, vector)
+
+def main(folder):
+    p = Path(folder).expanduser().resolve()
+    if not p.is_dir():
+        print(f"Folder not found: {p}")
+        return
+    epub_paths = sorted(p.rglob('*.epub'))
+    if not epub_paths:
+        print("No EPUB files found")
+        return
+    total_read = 0
+    total_size = 0
+    probed = 0
+    for epub_path in epub_paths:
+        try:
+            with EpubBook(epub_path) as book:
+                cover_path = book.cover_path if book.opf_path else None
+                if cover_path is None:
+                    continue
+                size = book.info(cover_path).file_size
+                w, h, bytes_read = probe_member(book, cover_path)
+        except Exception as e:
+            print(f"{epub_path.name[:-5]}: error ({e})")
+            continue
+        probed += 1
+        total_read += bytes_read
+        total_size += size
+        dims = f"{w}x{h}" if w is not None else "unknown"
+        print(f"{epub_path.name[:-5][:40]:<40} {dims:>11}  read {bytes_read / 1024:.1f}KB of {size / 1024:.1f}KB")
+    if probed:
+        print(f"\nProbed {probed} covers: read {total_read / 1024:.1f}KB of {total_size / 1024:.1f}KB ({total_read / probed / 1024:.1f}KB per book)")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='List cover dimensions and the bytes read to find them.')
+    parser.add_argument('folder', nargs='?', help='library folder to scan')
+    return parser
+
+def run(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.folder is not None:
+        folder = Path(args.folder)
+    elif sys.stdin.isatty():
+        from batch_cli import prompt_root
+        folder = prompt_root()
+    else:
+        parser.error('no input: give a library folder')
+    main(folder)
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
@@ -0,0 +1,182 @@
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import zipfile
+from pathlib import Path
+from result_cache import file_identity
+
+settle_seconds = 2.0
+max_settle_seconds = 60.0
+poll_interval = 5.0
+idle_wait = 5.0
+busy_wait = 0.5
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+def is_epub(path):
+    return str(path).lower().endswith('.epub')
+
+def snapshot(root):
+    found = {}
+    for path in Path(root).rglob('*'):
+        if is_epub(path):
+            try:
+                found[path] = file_identity(path)
+            except OSError:
+                continue
+    return found
+
+class PollingWatcher:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.state = snapshot(self.root)
+        self.next_poll = time.monotonic() + poll_interval
+
+    def changes(self, timeout):
+        wait = self.next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(0.0, wait))
+        self.next_poll = time.monotonic() + poll_interval
+        state = snapshot(self.root)
+        changed = {path for path, identity in state.items() if self.state.get(path) != identity}
+        changed.update(path for path in self.state if path not in state)
+        self.state = state
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        try:
+            self.add_tree(self.root)
+        except OSError:
+            self.close()
+            raise
+
+    def add_dir(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+        self.dirs[wd] = Path(path)
+
+    def add_tree(self, root):
+        found = set()
+        for dirpath, dirnames, filenames in os.walk(root):
+            self.add_dir(dirpath)
+            found.update(Path(dirpath) / name for name in filenames if is_epub(name))
+        return found
+
+    def changes(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                changed.update(self.handle(wd, mask, name))
+        return changed
+
+    def handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            return set(snapshot(self.root))
+        if mask & IN_IGNORED:
+            self.dirs.pop(wd, None)
+            return set()
+        parent = self.dirs.get(wd)
+        if parent is None or not name:
+            return set()
+        path = parent / name
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    return self.add_tree(path)
+                except OSError:
+                    return set()
+            return set()
+        return {path} if is_epub(name) else set()
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def open_watcher(root):
+    try:
+        return InotifyWatcher(root)
+    except (OSError, AttributeError):
+        return PollingWatcher(root)
+
+def is_complete(path):
+    try:
+        return zipfile.is_zipfile(path)
+    except OSError:
+        return False
+
+def watch_paths(root, watcher=None):
+    watcher = watcher or open_watcher(root)
+    known = snapshot(root)
+    pending = {}
+    try:
+        while True:
+            now = time.monotonic()
+            for path in watcher.changes(busy_wait if pending else idle_wait):
+                if path not in pending:
+                    pending[path] = (None, now, now)
+            now = time.monotonic()
+            ready = []
+            for path, (identity, stable_since, first_seen) in list(pending.items()):
+                try:
+                    current = file_identity(path)
+                except OSError:
+                    del pending[path]
+                    known.pop(path, None)
+                    continue
+                if current != identity:
+                    pending[path] = (current, now, first_seen)
+                    continue
+                if now - stable_since < settle_seconds:
+                    continue
+                if not is_complete(path) and now - first_seen < max_settle_seconds:
+                    continue
+                del pending[path]
+                if known.get(path) != current:
+                    known[path] = current
+                    ready.append(path)
+            if ready:
+                yield sorted(ready)
+    finally:
+        watcher.close()
@@ -0,0 +1,254 @@
+import io
+import sys
+import random
+import argparse
+import zipfile
+from pathlib import Path
+from PIL import Image
+from search_strings import SEARCH_STRINGS
+
+books = 50
+seed = 1
+epub3_ratio = 0.5
+spine_docs = (4, 30)
+paragraphs = (10, 60)
+words_per_paragraph = (20, 120)
+toc_entries = (0, 40)
+toc_depth = (1, 3)
+cover_formats = {'jpg': 5, 'png': 2, 'gif': 1, 'svg': 1, 'none': 1}
+cover_dimensions = ((300, 450), (600, 900), (1600, 2400))
+cover_noise = 0.3
+empty_block_ratio = 0.15
+empty_run_length = (5, 40)
+copyright_ratio = 0.6
+watermark_ratio = 0.1
+nesting_ratio = 0.1
+nesting_depth = (50, 400)
+missing_toc_ratio = 0.1
+titlepage_ratio = 0.5
+stress_depth = 240
+stress_fanout = 20000
+
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+STRESS_KINDS = ('deep', 'wide')
+WORDS = ('the of and to in that was he for it with as his on be at by had not are but from or have an they which '
+         'one were her all she there would their we him been has when who will more no if out so said what up its '
+         'about into than them can only other new some could time these two may then do first any my now such like '
+         'our over man me even most made after also did many before must through back years where much your way '
+         'well down should because each just those people how too little state good very make world still own see '
+         'men work long get here between both life being under never day same another know while last might us '
+         'great old year off come since against go came right used take three river stone light house window').split()
+COPYRIGHT_LINES = ('Copyright © {year} {author}. All rights reserved.', 'Published by {publisher}.',
+                   'ISBN {isbn}', 'First published {year}. Printed in the United States of America.',
+                   'No part of this publication may be reproduced without permission.')
+
+def pick(rng, bounds):
+    return rng.randint(bounds[0], bounds[1])
+
+def sentence(rng, count):
+    text = ' '.join(rng.choice(WORDS) for _ in range(count))
+    return text[0].upper() + text[1:] + '.'
+
+def xhtml(title, body, epub3):
+    ns = ' xmlns:epub="http://www.idpf.org/2007/ops"' if epub3 else ''
+    doctype = '<!DOCTYPE html>' if epub3 else ('<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.1//EN" '
+                                              '"http://www.w3.org/TR/xhtml11/DTD/xhtml11.dtd">')
+    return (f'<?xml version="1.0" encoding="utf-8"?>\n{doctype}\n<html xmlns="http://www.w3.org/1999/xhtml"{ns}>\n'
+            f'<head><title>{title}</title><link rel="stylesheet" type="text/css" href="../styles/style.css"/></head>\n'
+            f'<body>\n{body}\n</body>\n</html>\n')
+
+def make_cover(rng, fmt, size):
+    w, h = size
+    if fmt == 'svg':
+        return (f'<?xml version="1.0" encoding="utf-8"?>\n<svg xmlns="http://www.w3.org/2000/svg" '
+                f'width="{w}" height="{h}" viewBox="0 0 {w} {h}"><rect width="{w}" height="{h}" fill="#336"/>'
+                f'<text x="20" y="60" font-size="40">{sentence(rng, 3)}</text></svg>').encode('utf-8')
+    img = Image.new('RGB', (w, h), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    noisy_rows = int(h * cover_noise)
+    if noisy_rows:
+        noise = Image.frombytes('RGB', (w, noisy_rows), rng.randbytes(w * noisy_rows * 3))
+        img.paste(noise, (0, h - noisy_rows))
+    buf = io.BytesIO()
+    if fmt == 'jpg':
+        img.save(buf, 'JPEG', quality=85)
+    elif fmt == 'png':
+        img.save(buf, 'PNG')
+    else:
+        img.convert('P').save(buf, 'GIF')
+    return buf.getvalue()
+
+def chapter_body(rng, index, watermark, empty_run, nested):
+    parts = [f'<h1>Chapter {index}</h1>']
+    for _ in range(pick(rng, paragraphs)):
+        parts.append(f'<p>{sentence(rng, pick(rng, words_per_paragraph))}</p>')
+    if empty_run:
+        at = rng.randrange(len(parts))
+        parts[at:at] = ['<p class="empty"></p>'] * pick(rng, empty_run_length)
+    if watermark:
+        parts.insert(rng.randrange(len(parts) + 1), f'<p>{watermark}</p>')
+    if nested:
+        depth = pick(rng, nesting_depth)
+        parts.append('<div>' * depth + f'<p>{sentence(rng, 8)}</p>' + '</div>' * depth)
+    return '\n'.join(parts)
+
+def toc_tree(rng, chapters, count, max_depth):
+    entries = []
+    for i in range(count):
+        target = chapters[i % len(chapters)]
+        depth = 1 if not entries else min(entries[-1][0] + rng.choice((-1, 0, 0, 1)), max_depth)
+        entries.append((max(1, depth), f'Entry {i + 1}', target))
+    return entries
+
+def nav_document(entries, epub3):
+    lines = ['<nav epub:type="toc" id="toc"><h1>Contents</h1><ol>']
+    depth = 1
+    for i, (level, label, target) in enumerate(entries):
+        if level > depth:
+            lines.append('<ol>')
+            depth += 1
+        elif i:
+            lines.append('</li>')
+            while depth > level:
+                lines.append('</ol></li>')
+                depth -= 1
+        lines.append(f'<li><a href="{target}">{label}</a>')
+    if entries:
+        lines.append('</li>')
+    while depth > 1:
+        lines.append('</ol></li>')
+        depth -= 1
+    lines.append('</ol></nav>')
+    return xhtml('Contents', '\n'.join(lines), epub3)
+
+def ncx_document(uid, title, entries):
+    points = []
+    stack = []
+    for order, (level, label, target) in enumerate(entries, 1):
+        while len(stack) >= level:
+            points.append('</navPoint>')
+            stack.pop()
+        points.append(f'<navPoint id="np{order}" playOrder="{order}"><navLabel><text>{label}</text></navLabel>'
+                      f'<content src="Text/{target}"/>')
+        stack.append(order)
+    points.extend('</navPoint>' for _ in stack)
+    return (f'<?xml version="1.0" encoding="utf-8"?>\n<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">'
+            f'<head><meta name="dtb:uid" content="{uid}"/></head><docTitle><text>{title}</text></docTitle>'
+            f'<navMap>{"".join(points)}</navMap></ncx>')
+
+def make_book(rng, index):
+    epub3 = rng.random() < epub3_ratio
+    title = sentence(rng, 3)[:-1]
+    author = f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}'
+    uid = f'urn:uuid:{rng.getrandbits(128):032x}'
+    files = {}
+    manifest = []
+    spine = []
+    cover_format = rng.choices(list(cover_formats), weights=list(cover_formats.values()))[0]
+    if cover_format != 'none':
+        cover_name = f'images/cover.{cover_format}'
+        media_type = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'svg': 'image/svg+xml'}[cover_format]
+        files[cover_name] = make_cover(rng, cover_format, rng.choice(cover_dimensions))
+        props = ' properties="cover-image"' if epub3 else ''
+        manifest.append(f'<item id="cover-image" href="{cover_name}" media-type="{media_type}"{props}/>')
+        if rng.random() < titlepage_ratio:
+            body = f'<div class="cover"><img src="../{cover_name}" alt="cover"/></div>'
+            files['Text/titlepage.xhtml'] = xhtml('Cover', body, epub3)
+            manifest.append('<item id="titlepage" href="Text/titlepage.xhtml" media-type="application/xhtml+xml"/>')
+            spine.append('titlepage')
+    if rng.random() < copyright_ratio:
+        lines = [line.format(year=rng.randint(1950, 2024), author=author, publisher=f'{rng.choice(WORDS).title()} Press',
+                             isbn=f'978-{rng.randrange(10**9):09d}') for line in COPYRIGHT_LINES]
+        files['Text/copyright.xhtml'] = xhtml('Copyright', '\n'.join(f'<p>{line}</p>' for line in lines), epub3)
+        manifest.append('<item id="copyright" href="Text/copyright.xhtml" media-type="application/xhtml+xml"/>')
+        spine.append('copyright')
+    watermark = rng.choice(SEARCH_STRINGS) if rng.random() < watermark_ratio else None
+    empty_runs = rng.random() < empty_block_ratio
+    nested = rng.random() < nesting_ratio
+    chapters = []
+    count = pick(rng, spine_docs)
+    for i in range(1, count + 1):
+        name = f'chapter{i:03d}.xhtml'
+        chapters.append(name)
+        mark = watermark if watermark and i in (1, count) else None
+        body = chapter_body(rng, i, mark, empty_runs and i == 2, nested and i == 3)
+        files[f'Text/{name}'] = xhtml(f'Chapter {i}', body, epub3)
+        manifest.append(f'<item id="ch{i}" href="Text/{name}" media-type="application/xhtml+xml"/>')
+        spine.append(f'ch{i}')
+    files['styles/style.css'] = 'body { margin: 0 } p { text-indent: 1em } .empty { height: 1em }\n'
+    manifest.append('<item id="css" href="styles/style.css" media-type="text/css"/>')
+    spine_toc = ''
+    if rng.random() >= missing_toc_ratio:
+        entries = toc_tree(rng, chapters, pick(rng, toc_entries), pick(rng, toc_depth))
+        if epub3:
+            files['nav.xhtml'] = nav_document([(d, label, f'Text/{t}') for d, label, t in entries], epub3)
+            manifest.append('<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>')
+        files['toc.ncx'] = ncx_document(uid, title, entries)
+        manifest.append('<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>')
+        spine_toc = ' toc="ncx"'
+    meta_cover = '<meta name="cover" content="cover-image"/>' if cover_format != 'none' and not epub3 else ''
+    modified = '<meta property="dcterms:modified">2024-01-01T00:00:00Z</meta>' if epub3 else ''
+    opf = (f'<?xml version="1.0" encoding="utf-8"?>\n<package xmlns="http://www.idpf.org/2007/opf" '
+           f'version="{"3.0" if epub3 else "2.0"}" unique-identifier="uid">\n'
+           f'<metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:identifier id="uid">{uid}</dc:identifier>'
+           f'<dc:title>{title}</dc:title><dc:creator>{author}</dc:creator><dc:language>en</dc:language>'
+           f'{meta_cover}{modified}</metadata>\n<manifest>\n' + '\n'.join(manifest) + '\n</manifest>\n'
+           f'<spine{spine_toc}>\n' + '\n'.join(f'<itemref idref="{idref}"/>' for idref in spine) + '\n</spine>\n</package>\n')
+    return f'book{index:05d}_v{3 if epub3 else 2}.epub', zip_book(opf, files)
+
+def zip_book(opf, files):
+    container = ('<?xml version="1.0"?>\n<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                 '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+                 '</rootfiles></container>')
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        z.writestr(zipfile.ZipInfo('mimetype', ZIP_DATE), 'application/epub+zip', zipfile.ZIP_STORED)
+        z.writestr(zipfile.ZipInfo('META-INF/container.xml', ZIP_DATE), container, zipfile.ZIP_DEFLATED)
+        z.writestr(zipfile.ZipInfo('OEBPS/content.opf', ZIP_DATE), opf, zipfile.ZIP_DEFLATED)
+        for name, data in files.items():
+            z.writestr(zipfile.ZipInfo(f'OEBPS/{name}', ZIP_DATE), data, zipfile.ZIP_DEFLATED)
+    return buf.getvalue()
+
+def stress_body(kind):
+    if kind == 'deep':
+        tags = ['div' if level % 2 else 'span' for level in range(stress_depth)]
+        return (''.join(f'<{tag} class="level{level}">' for level, tag in enumerate(tags)) +
+                '<h2 class="cover">Deep</h2>' + ''.join(f'</{tag}>' for tag in reversed(tags)))
+    if kind == 'wide':
+        return ''.join(f'<p class="p{i}">{WORDS[i % 50]}</p>' for i in range(stress_fanout)) + '<h2 class="cover">Wide</h2>'
+    raise ValueError(f'unknown stress kind: {kind}')
+
+def make_stress_book(kind):
+    files = {'Text/stress.xhtml': xhtml(kind.title(), stress_body(kind), True)}
+    opf = ('<?xml version="1.0" encoding="utf-8"?>\n<package xmlns="http://www.idpf.org/2007/opf" version="3.0" '
+           'unique-identifier="uid">\n<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+           f'<dc:identifier id="uid">urn:stress:{kind}</dc:identifier><dc:title>Stress {kind}</dc:title>'
+           '<dc:language>en</dc:language></metadata>\n<manifest>\n'
+           '<item id="stress" href="Text/stress.xhtml" media-type="application/xhtml+xml"/>\n</manifest>\n'
+           '<spine>\n<itemref idref="stress"/>\n</spine>\n</package>\n')
+    return f'stress_{kind}.epub', zip_book(opf, files)
+
+def generate(out_dir, count=None, corpus_seed=None):
+    out = Path(out_dir).expanduser()
+    out.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed if corpus_seed is None else corpus_seed)
+    written = []
+    for index in range(books if count is None else count):
+        name, data = make_book(random.Random(rng.getrandbits(64)), index)
+        path = out / name
+        path.write_bytes(data)
+        written.append(path)
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a deterministic synthetic EPUB corpus.')
+    parser.add_argument('out_dir')
+    parser.add_argument('--books', type=int, default=books)
+    parser.add_argument('--seed', type=int, default=seed)
+    args = parser.parse_args(argv)
+    written = generate(args.out_dir, args.books, args.seed)
+    total = sum(path.stat().st_size for path in written)
+    print(f"Wrote {len(written)} EPUB files ({total / (1024 * 1024):.1f}MB) to {args.out_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import time
+import threading
+from array import array
+from math import ceil
+
+enabled = False
+forward = False
+PERCENTILES = (50, 95, 99)
+PHASES = ['zip_open', 'find_opf', 'opf_parse', 'decompress', 'lxml_parse', 'pillow', 'thread', 'heuristics', 'total']
+NO_CHECKER = '-'
+ALL_CHECKERS = 'all'
+
+class _ThreadStack(threading.local):
+    def __init__(self):
+        self.phases = []
+
+_thread = _ThreadStack()
+_lock = threading.Lock()
+_book = {}
+_outbox = []
+_stats = {}
+_order = []
+observers = []
+
+class NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, n):
+        pass
+
+NULL_PHASE = NullPhase()
+
+class Phase:
+    __slots__ = ('checker', 'name', 'stack', 'wall', 'cpu', 'child_wall', 'child_cpu', 'nbytes')
+
+    def __init__(self, checker, name):
+        self.checker = checker
+        self.name = name
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+        self.nbytes = 0
+
+    def __enter__(self):
+        self.stack = _thread.phases
+        self.stack.append(self)
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        stack = self.stack
+        stack.pop()
+        if stack:
+            parent = stack[-1]
+            parent.child_wall += wall
+            parent.child_cpu += cpu
+        key = (self.checker, self.name)
+        with _lock:
+            entry = _book.get(key)
+            if entry is None:
+                entry = _book[key] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += wall - self.child_wall
+            entry[2] += cpu - self.child_cpu
+            entry[3] += self.nbytes
+        return False
+
+    def add_bytes(self, n):
+        self.nbytes += n
+
+class TimedStream:
+    __slots__ = ('f',)
+
+    def __init__(self, f):
+        self.f = f
+
+    def read(self, n=-1):
+        with phase('decompress') as p:
+            data = self.f.read(n)
+            p.add_bytes(len(data))
+        return data
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+def current_checker():
+    stack = _thread.phases
+    return stack[-1].checker if stack else NO_CHECKER
+
+def phase(name):
+    if not enabled:
+        return NULL_PHASE
+    return Phase(current_checker(), name)
+
+def checker(name):
+    if not enabled:
+        return NULL_PHASE
+    return Phase(name, 'heuristics')
+
+def bind(fn):
+    if not enabled:
+        return fn
+    checker_name = current_checker()
+
+    def run(*args):
+        with Phase(checker_name, 'thread'):
+            return fn(*args)
+    return run
+
+def timed_stream(f):
+    if not enabled:
+        return f
+    return TimedStream(f)
+
+def start_book():
+    _book.clear()
+
+def finish_book(path):
+    if not enabled:
+        return None
+    book = (str(path), dict(_book))
+    _book.clear()
+    if forward:
+        _outbox.append(book)
+    else:
+        record(book)
+    return book
+
+def drain():
+    books = list(_outbox)
+    _outbox.clear()
+    return books
+
+def merge(books):
+    for book in books or ():
+        record(book)
+
+def _add(key, calls, wall, cpu, nbytes):
+    stat = _stats.get(key)
+    if stat is None:
+        stat = _stats[key] = [0, 0.0, 0.0, 0, array('d')]
+        _order.append(key)
+    stat[0] += calls
+    stat[1] += wall
+    stat[2] += cpu
+    stat[3] += nbytes
+    stat[4].append(wall)
+
+def record(book):
+    path, entries = book
+    totals = {}
+    for (checker_name, phase_name), (calls, wall, cpu, nbytes) in entries.items():
+        _add((checker_name, phase_name), calls, wall, cpu, nbytes)
+        for key in ((checker_name, 'total'), (ALL_CHECKERS, phase_name), (ALL_CHECKERS, 'total')):
+            total = totals.setdefault(key, [0, 0.0, 0.0, 0])
+            if key[1] != 'total' or phase_name == 'heuristics':
+                total[0] += calls
+            total[1] += wall
+            total[2] += cpu
+            total[3] += nbytes
+    for key, (calls, wall, cpu, nbytes) in totals.items():
+        _add(key, calls, wall, cpu, nbytes)
+    for observer in observers:
+        observer(book)
+
+def reset():
+    _thread.phases.clear()
+    _book.clear()
+    _outbox.clear()
+    _stats.clear()
+    _order.clear()
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, ceil(p / 100 * len(ordered)) - 1)]
+
+def _phase_rank(name):
+    return PHASES.index(name) if name in PHASES else len(PHASES) - 1
+
+def rows():
+    checkers = []
+    for checker_name, _ in _order:
+        if checker_name not in checkers and checker_name != ALL_CHECKERS:
+            checkers.append(checker_name)
+    checkers.append(ALL_CHECKERS)
+    table = []
+    for checker_name in checkers:
+        keys = sorted((key for key in _stats if key[0] == checker_name), key=lambda key: _phase_rank(key[1]))
+        for key in keys:
+            calls, wall, cpu, nbytes, samples = _stats[key]
+            row = {'checker': key[0], 'phase': key[1], 'books': len(samples), 'calls': calls,
+                   'wall': wall, 'cpu': cpu, 'bytes': nbytes}
+            for p in PERCENTILES:
+                row[f'p{p}'] = percentile(samples, p)
+            table.append(row)
+    return table
+
+def format_table(table=None):
+    table = rows() if table is None else table
+    if not table:
+        return ['No timing data recorded']
+    header = (f"{'checker':<24} {'phase':<11} {'books':>6} {'calls':>8} {'wall s':>9} {'cpu s':>9} {'MB':>8} " +
+              ' '.join(f"{f'p{p} ms':>9}" for p in PERCENTILES))
+    lines = [header, '-' * len(header)]
+    previous = None
+    for row in table:
+        if previous is not None and row['checker'] != previous:
+            lines.append('')
+        previous = row['checker']
+        lines.append(f"{row['checker']:<24} {row['phase']:<11} {row['books']:>6} {row['calls']:>8} "
+                     f"{row['wall']:>9.3f} {row['cpu']:>9.3f} {row['bytes'] / (1024 * 1024):>8.2f} " +
+                     ' '.join(f"{row[f'p{p}'] * 1000:>9.2f}" for p in PERCENTILES))
+    return lines
@@ -0,0 +1,346 @@
+import os
+import zlib
+import errno
+import time
+import queue
+import struct
+import threading
+import contextlib
+from zipfile import ZIP_STORED, ZIP_DEFLATED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory, resource_tracker
+
+readers = 2
+ready_depth = 4
+inflight_per_job = 2
+max_prefetch_bytes = 512 * 1024 * 1024
+max_shared_bytes = 1024 * 1024 * 1024
+shm_headroom = 0.5
+shm_path = '/dev/shm'
+poll_interval = 0.1
+
+LOCAL_HEADER = struct.Struct('<4s22xHH')
+
+class SharedBufferFile:
+    __slots__ = ('view', 'pos')
+
+    def __init__(self, buf, size):
+        self.view = buf[:size]
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += len(self.view)
+        if offset < 0:
+            raise OSError(errno.EINVAL, f"negative seek position {offset}")
+        self.pos = offset
+        return offset
+
+    def read(self, n=-1):
+        start = self.pos
+        end = len(self.view) if n is None or n < 0 else min(start + n, len(self.view))
+        if end <= start:
+            return b''
+        self.pos = end
+        return self.view[start:end].tobytes()
+
+    def readinto(self, b):
+        start = self.pos
+        end = min(start + len(b), len(self.view))
+        if end <= start:
+            return 0
+        self.pos = end
+        b[:end - start] = self.view[start:end]
+        return end - start
+
+    def member(self, info):
+        if info.flag_bits & 1 or info.compress_type not in (ZIP_STORED, ZIP_DEFLATED):
+            return None
+        try:
+            signature, name_length, extra_length = LOCAL_HEADER.unpack_from(self.view, info.header_offset)
+        except struct.error:
+            return None
+        start = info.header_offset + LOCAL_HEADER.size + name_length + extra_length
+        end = start + info.compress_size
+        if signature != b'PK\x03\x04' or end > len(self.view):
+            return None
+        compressed = self.view[start:end]
+        try:
+            data = bytes(compressed) if info.compress_type == ZIP_STORED else zlib.decompress(compressed, -15)
+        except zlib.error:
+            return None
+        finally:
+            compressed.release()
+        if len(data) != info.file_size or zlib.crc32(data) != info.CRC:
+            return None
+        return data
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.view.release()
+
+@contextlib.contextmanager
+def attached(buffer):
+    name, size = buffer
+    shm = shared_memory.SharedMemory(name=name)
+    f = SharedBufferFile(shm.buf, size)
+    try:
+        yield f
+    finally:
+        f.close()
+        shm.close()
+
+def lost_results(names, error):
+    return {name: (None, str(error)) for name in names}
+
+def release(shm):
+    if shm is not None:
+        shm.close()
+        shm.unlink()
+
+def shared_budget():
+    try:
+        st = os.statvfs(shm_path)
+    except (OSError, AttributeError):
+        return max_shared_bytes
+    return min(max_shared_bytes, int(st.f_bavail * st.f_frsize * shm_headroom))
+
+def read_into_shared(path, size):
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(shm._fd, 0, size)
+        view = shm.buf[:size]
+        filled = 0
+        try:
+            with open(path, 'rb', buffering=0) as f:
+                while filled < size:
+                    n = f.readinto(view[filled:])
+                    if not n:
+                        break
+                    filled += n
+        finally:
+            view.release()
+    except BaseException:
+        release(shm)
+        raise
+    if not filled:
+        release(shm)
+        return None, 0
+    return shm, filled
+
+class StageStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.peaks = {}
+
+    def add(self, key, amount=1):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def peak(self, key, value):
+        with self.lock:
+            if value > self.peaks.get(key, 0):
+                self.peaks[key] = value
+
+    def get(self, key):
+        return self.values.get(key, 0)
+
+    def rows(self):
+        return [
+            {'stage': 'read', 'books': self.get('read_books'), 'bytes': self.get('read_bytes'),
+             'busy': self.get('read_seconds'), 'wait': self.get('read_blocked'), 'fallback': self.get('read_fallback')},
+            {'stage': 'dispatch', 'books': self.get('dispatched'), 'bytes': self.get('dispatched_bytes'),
+             'busy': 0.0, 'wait': self.get('dispatch_wait'), 'peak_ready': self.peaks.get('ready', 0),
+             'peak_shared_bytes': self.peaks.get('shared_bytes', 0)},
+            {'stage': 'scan', 'books': self.get('scanned'), 'bytes': self.get('dispatched_bytes'),
+             'busy': self.get('scan_seconds'), 'cpu': self.get('scan_cpu'), 'wait': self.get('result_wait')},
+        ]
+
+    def format(self):
+        lines = [f"{'stage':<10} {'books':>7} {'MB':>9} {'busy s':>9} {'wait s':>9}"]
+        for row in self.rows():
+            lines.append(f"{row['stage']:<10} {row['books']:>7} {row['bytes'] / (1024 * 1024):>9.2f} "
+                         f"{row['busy']:>9.3f} {row['wait']:>9.3f}")
+        lines.append(f"elapsed {self.get('elapsed'):.3f}s; read fallbacks {self.get('read_fallback')}; "
+                     f"peak ready queue {self.peaks.get('ready', 0)}; "
+                     f"peak shared {self.peaks.get('shared_bytes', 0) / (1024 * 1024):.2f}MB; "
+                     f"scan cpu {self.get('scan_cpu'):.3f}s")
+        return lines
+
+class Prefetcher:
+    def __init__(self, reader_threads=None, depth=None):
+        self.reader_threads = reader_threads or readers
+        self.depth = depth or ready_depth
+        self.stats = StageStats()
+        self.shared_bytes = 0
+        self.threads = []
+        self.budget = max_shared_bytes
+        self.space = threading.Condition(self.stats.lock)
+        resource_tracker.ensure_running()
+
+    def window(self, jobs):
+        return max(1, jobs) * inflight_per_job + self.depth + self.reader_threads
+
+    def reserve(self, size):
+        if size == 0 or size > min(max_prefetch_bytes, self.budget):
+            return False
+        started = time.perf_counter()
+        with self.space:
+            while self.shared_bytes + size > self.budget:
+                if self.stop.is_set():
+                    return False
+                self.space.wait(poll_interval)
+            self.shared_bytes += size
+            if self.shared_bytes > self.stats.peaks.get('shared_bytes', 0):
+                self.stats.peaks['shared_bytes'] = self.shared_bytes
+        self.stats.add('read_blocked', time.perf_counter() - started)
+        return True
+
+    def unreserve(self, size):
+        with self.space:
+            self.shared_bytes -= size
+            self.space.notify_all()
+
+    def prefetch(self, task):
+        shm, size = None, 0
+        try:
+            reserved = os.path.getsize(task[1])
+        except OSError:
+            reserved = 0
+        if self.reserve(reserved):
+            started = time.perf_counter()
+            try:
+                shm, size = read_into_shared(task[1], reserved)
+            except Exception:
+                pass
+            self.unreserve(reserved - size)
+            self.stats.add('read_seconds', time.perf_counter() - started)
+        self.stats.add('read_books')
+        self.stats.add('read_bytes', size)
+        if shm is None:
+            self.stats.add('read_fallback')
+        return task, shm, size
+
+    def forget(self, shm, size):
+        if shm is None:
+            return
+        release(shm)
+        self.unreserve(size)
+
+    def read_loop(self):
+        while not self.stop.is_set():
+            try:
+                task = self.todo.get(timeout=poll_interval)
+            except queue.Empty:
+                continue
+            entry = self.prefetch(task)
+            started = time.perf_counter()
+            while True:
+                if self.stop.is_set():
+                    self.forget(entry[1], entry[2])
+                    return
+                try:
+                    self.ready.put(entry, timeout=poll_interval)
+                    break
+                except queue.Full:
+                    continue
+            self.stats.add('read_blocked', time.perf_counter() - started)
+            self.stats.peak('ready', self.ready.qsize())
+
+    def start(self, execute, worker, jobs):
+        self.started = time.perf_counter()
+        self.execute = execute
+        self.worker = worker
+        self.limit = max(1, jobs) * inflight_per_job
+        self.budget = shared_budget()
+        self.todo = queue.Queue()
+        self.ready = queue.Queue(self.depth)
+        self.done = queue.Queue()
+        self.stop = threading.Event()
+        self.buffers = {}
+        self.submitted = 0
+        self.dispatched = 0
+        self.threads = [threading.Thread(target=self.read_loop, daemon=True) for _ in range(self.reader_threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, task):
+        self.todo.put(task)
+        self.submitted += 1
+
+    def dispatch(self, block):
+        while len(self.buffers) < self.limit and self.dispatched < self.submitted:
+            wait_started = time.perf_counter()
+            try:
+                task, shm, size = self.ready.get(block)
+            except queue.Empty:
+                return
+            self.stats.add('dispatch_wait', time.perf_counter() - wait_started)
+            index, epub_path, names = task
+            self.buffers[index] = (shm, size)
+            buffer = (shm.name, size) if shm is not None else None
+            future = self.execute(self.worker, (index, epub_path, names, buffer))
+            future.add_done_callback(lambda future, task=task: self.done.put((task, future)))
+            self.stats.add('dispatched')
+            self.stats.add('dispatched_bytes', size)
+            self.dispatched += 1
+            block = False
+
+    def result(self, block=True):
+        self.dispatch(block and not self.buffers)
+        wait_started = time.perf_counter()
+        while True:
+            try:
+                outcome = self.done.get(block, poll_interval)
+                break
+            except queue.Empty:
+                if not block:
+                    return None
+                self.dispatch(not self.buffers)
+        self.stats.add('result_wait', time.perf_counter() - wait_started)
+        task, future = outcome
+        self.forget(*self.buffers.pop(task[0]))
+        try:
+            index, scanned, timings, (wall, cpu) = future.result()
+        except BrokenProcessPool as e:
+            return task[0], lost_results(task[2], e), None
+        self.stats.add('scanned')
+        self.stats.add('scan_seconds', wall)
+        self.stats.add('scan_cpu', cpu)
+        return index, scanned, timings
+
+    def close(self):
+        if not self.threads:
+            return
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        while True:
+            try:
+                _, shm, size = self.ready.get_nowait()
+            except queue.Empty:
+                break
+            self.forget(shm, size)
+        for shm, size in self.buffers.values():
+            self.forget(shm, size)
+        self.buffers = {}
+        self.stats.add('elapsed', time.perf_counter() - self.started)
@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import pickle
+import hashlib
+import sqlite3
+from pathlib import Path
+
+max_cache_bytes = 256 * 1024 * 1024
+commit_every = 200
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    path TEXT NOT NULL,
+    checker TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    settings TEXT NOT NULL,
+    version TEXT NOT NULL,
+    result BLOB NOT NULL,
+    nbytes INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (path, checker, settings)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+'''
+
+NEUTRAL_SETTINGS = frozenset(('doc_threads', 'index_path', 'print_warnings', 'printKeyError', 'sidecar_index'))
+SETTING_TYPES = (bool, int, float, str, bytes, tuple, list, dict, set, frozenset, type(None))
+
+def file_identity(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+def _canonical(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(_canonical(v) for v in value)
+    if isinstance(value, dict):
+        return sorted((_canonical(k), _canonical(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return repr(value)
+
+def _local_dependencies(module):
+    here = Path(__file__).resolve().parent
+    deps = {}
+    for value in vars(module).values():
+        dep_name = getattr(value, '__module__', None)
+        if dep_name is None and isinstance(value, type(sys)):
+            dep_name = value.__name__
+        dep = sys.modules.get(dep_name) if dep_name else None
+        dep_file = getattr(dep, '__file__', None)
+        if dep is not None and dep is not module and dep_file and Path(dep_file).resolve().parent == here:
+            deps[dep_name] = dep
+    return deps
+
+def code_version(module):
+    explicit = getattr(module, 'CHECKER_VERSION', None)
+    h = hashlib.sha1()
+    if explicit is not None:
+        h.update(str(explicit).encode())
+    sources = {module.__name__: module}
+    sources.update(_local_dependencies(module))
+    for name in sorted(sources):
+        source_file = getattr(sources[name], '__file__', None)
+        if source_file:
+            h.update(name.encode())
+            h.update(Path(source_file).read_bytes())
+    return h.hexdigest()[:16]
+
+def settings_version(module):
+    neutral = NEUTRAL_SETTINGS.union(getattr(module, 'FORMAT_SETTINGS', ()))
+    h = hashlib.sha1()
+    for name in sorted(vars(module)):
+        value = getattr(module, name)
+        if name.startswith('_') or name in neutral or not isinstance(value, SETTING_TYPES):
+            continue
+        h.update(f'{name}={_canonical(value)!r}\n'.encode())
+    return h.hexdigest()[:16]
+
+def cache_key(module):
+    return settings_version(module), code_version(module)
+
+def checker_version(module):
+    return '-'.join(cache_key(module))
+
+class ResultCache:
+    def __init__(self, db_path, max_bytes=None):
+        self.db_path = str(Path(db_path).expanduser())
+        self.max_bytes = max_cache_bytes if max_bytes is None else max_bytes
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(results)')]
+        if columns and 'settings' not in columns:
+            self.conn.execute('DROP TABLE results')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.conn is None:
+            return
+        self.evict()
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+
+    def prune_versions(self, versions):
+        for checker, (_, version) in versions.items():
+            self.conn.execute('DELETE FROM results WHERE checker = ? AND version != ?', (checker, version))
+        self.conn.commit()
+
+    def get(self, path, identity, versions):
+        size, mtime_ns, inode = identity
+        rows = self.conn.execute(
+            'SELECT checker, settings, version, size, mtime_ns, inode, result FROM results WHERE path = ?',
+            (str(path),)).fetchall()
+        found = {}
+        for checker, settings, version, r_size, r_mtime_ns, r_inode, blob in rows:
+            if versions.get(checker) != (settings, version):
+                continue
+            if (r_size, r_mtime_ns, r_inode) != (size, mtime_ns, inode):
+                continue
+            try:
+                found[checker] = pickle.loads(blob)
+            except Exception:
+                continue
+        if found:
+            now = time.time()
+            self.conn.executemany(
+                'UPDATE results SET last_used = ? WHERE path = ? AND checker = ? AND settings = ?',
+                [(now, str(path), checker, versions[checker][0]) for checker in found])
+            self._maybe_commit()
+        self.hits += len(found)
+        self.misses += len(versions) - len(found)
+        return found
+
+    def put(self, path, identity, versions, results):
+        size, mtime_ns, inode = identity
+        now = time.time()
+        rows = []
+        for checker, result in results.items():
+            blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            settings, version = versions[checker]
+            rows.append((str(path), checker, size, mtime_ns, inode, settings, version, blob, len(blob), now))
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO results '
+            '(path, checker, size, mtime_ns, inode, settings, version, result, nbytes, last_used) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self._maybe_commit()
+
+    def _maybe_commit(self):
+        self.pending += 1
+        if self.pending >= commit_every:
+            self.conn.commit()
+            self.pending = 0
+            self.evict()
+
+    def total_bytes(self):
+        return self.conn.execute('SELECT COALESCE(SUM(nbytes), 0) FROM results').fetchone()[0]
+
+    def evict(self):
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+        doomed = []
+        for rowid, nbytes in self.conn.execute('SELECT rowid, nbytes FROM results ORDER BY last_used'):
+            if total <= self.max_bytes:
+                break
+            doomed.append((rowid,))
+            total -= nbytes
+        self.conn.executemany('DELETE FROM results WHERE rowid = ?', doomed)
+        self.conn.commit()
+        return len(doomed)
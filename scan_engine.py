@@ -0,0 +1,293 @@
+import sys
+import time
+import queue
+import signal
+import importlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from epub_book import EpubBook
+import phase_timing
+import pipeline
+from result_cache import cache_key, file_identity
+from library_watch import watch_paths
+
+CHECKERS = [
+    'complex_scan',
+    'detect_no_toc',
+    'check_titlepage',
+    'search_strings',
+    'detect_empty_blocks',
+    'check_copyright',
+    'check_copyright_toc',
+    'check_css_links',
+    'image_style',
+    'check_cover_size',
+    'check_small_cover',
+    'check_double_titlepage',
+    'contains_png',
+    'find_epub3',
+    'flag_page_map',
+    'find_no_headers',
+]
+
+ahead_per_job = 8
+
+def load_checkers(names=None):
+    checkers = []
+    for name in names or CHECKERS:
+        if name not in CHECKERS:
+            raise ValueError(f"Unknown checker: {name}")
+        checkers.append((name, importlib.import_module(name)))
+    return checkers
+
+def scan_book(epub_path, checkers, source=None):
+    results = {}
+    phase_timing.start_book()
+    try:
+        with EpubBook(str(epub_path), source) as book:
+            for name, module in checkers:
+                try:
+                    with phase_timing.checker(name):
+                        results[name] = (module.check_book(book), None)
+                except Exception as e:
+                    results[name] = (None, str(e))
+    finally:
+        phase_timing.finish_book(epub_path)
+    return results
+
+_worker_checkers = None
+
+def _init_worker(names, overrides, timing=False):
+    global _worker_checkers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    phase_timing.enabled = timing
+    phase_timing.forward = timing
+    _worker_checkers = load_checkers(names)
+    apply_overrides(_worker_checkers, overrides)
+    prepare_checkers(_worker_checkers)
+
+def _scan_in_worker(task):
+    index, epub_path, names = task
+    checkers = [(name, module) for name, module in _worker_checkers if name in names]
+    return index, scan_book(epub_path, checkers), phase_timing.drain()
+
+def _scan_shared(task):
+    index, epub_path, names, buffer = task
+    checkers = [(name, module) for name, module in _worker_checkers if name in names]
+    started = time.perf_counter()
+    cpu = time.process_time()
+    if buffer is None:
+        results = scan_book(epub_path, checkers)
+    else:
+        with pipeline.attached(buffer) as source:
+            results = scan_book(epub_path, checkers, source)
+    return index, results, phase_timing.drain(), (time.perf_counter() - started, time.process_time() - cpu)
+
+def apply_overrides(checkers, overrides):
+    for name, module in checkers:
+        for attr, value in (overrides or {}).get(name, {}).items():
+            setattr(module, attr, value)
+
+def prepare_checkers(checkers):
+    for name, module in checkers:
+        prepare = getattr(module, 'prepare', None)
+        if prepare is not None:
+            prepare()
+
+class Scanner:
+    def __init__(self, checkers, jobs=1, overrides=None, prefetcher=None):
+        self.checkers = checkers
+        self.jobs = jobs
+        self.overrides = overrides
+        self.prefetcher = prefetcher
+        self.pool = None
+        self.done = None
+        self.serial = deque()
+        self.started = False
+        if prefetcher is not None:
+            self.window = prefetcher.window(jobs)
+        elif jobs <= 1:
+            self.window = 1
+        else:
+            self.window = jobs * ahead_per_job
+
+    def _start(self):
+        self.started = True
+        prepare_checkers(self.checkers)
+        if self.prefetcher is None and self.jobs <= 1:
+            return
+        self.pool = self._new_pool()
+        if self.prefetcher is not None:
+            self.prefetcher.start(self.execute, _scan_shared, self.jobs)
+        else:
+            self.done = queue.Queue()
+
+    def _new_pool(self):
+        names = [name for name, _ in self.checkers]
+        return ProcessPoolExecutor(self.jobs, initializer=_init_worker,
+                                   initargs=(names, self.overrides, phase_timing.enabled))
+
+    def execute(self, worker, task):
+        try:
+            return self.pool.submit(worker, task)
+        except BrokenProcessPool:
+            self.pool.shutdown(wait=False)
+            self.pool = self._new_pool()
+            return self.pool.submit(worker, task)
+
+    def submit(self, task):
+        if not self.started:
+            self._start()
+        if self.prefetcher is not None:
+            self.prefetcher.submit(task)
+        elif self.pool is not None:
+            future = self.execute(_scan_in_worker, task)
+            future.add_done_callback(lambda future, task=task: self.done.put((task, future)))
+        else:
+            self.serial.append(task)
+
+    def result(self, block=True):
+        if self.prefetcher is not None:
+            return self.prefetcher.result(block)
+        if self.pool is None:
+            index, epub_path, missing = self.serial.popleft()
+            by_name = dict(self.checkers)
+            return index, scan_book(epub_path, [(name, by_name[name]) for name in missing]), None
+        try:
+            task, future = self.done.get(block)
+        except queue.Empty:
+            return None
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            return task[0], pipeline.lost_results(task[2], e), None
+
+    def close(self):
+        try:
+            if self.prefetcher is not None:
+                self.prefetcher.close()
+        finally:
+            if self.pool is not None:
+                for process in list((self.pool._processes or {}).values()):
+                    process.terminate()
+                self.pool.shutdown(cancel_futures=True)
+                self.pool = None
+            self.serial.clear()
+            self.started = False
+
+def iter_results(epub_paths, checkers, jobs=1, overrides=None, cache=None, prefetcher=None, scanner=None):
+    names = [name for name, _ in checkers]
+    versions = {}
+    if cache is not None:
+        versions = {name: cache_key(module) for name, module in checkers}
+    owned = scanner is None
+    if owned:
+        scanner = Scanner(checkers, jobs, overrides, prefetcher)
+    order = deque()
+    pending = {}
+    inflight = 0
+
+    def collect(block):
+        nonlocal inflight
+        outcome = scanner.result(block)
+        if outcome is None:
+            return False
+        index, scanned, timings = outcome
+        phase_timing.merge(timings)
+        pending[index] = scanned
+        inflight -= 1
+        return True
+
+    def drain():
+        while order:
+            index, epub_path, identity, hits, scanning = order[0]
+            if scanning:
+                if index not in pending:
+                    return
+                scanned = pending.pop(index)
+            else:
+                scanned = {}
+            order.popleft()
+            if identity is not None:
+                fresh = {name: result for name, (result, error) in scanned.items() if error is None}
+                if fresh:
+                    cache.put(epub_path, identity, versions, fresh)
+            results = {name: (result, None) for name, result in hits.items()}
+            results.update(scanned)
+            yield epub_path, {name: results[name] for name in names}
+
+    try:
+        for index, epub_path in enumerate(epub_paths):
+            identity = None
+            hits = {}
+            if cache is not None:
+                try:
+                    identity = file_identity(epub_path)
+                except OSError:
+                    pass
+                else:
+                    hits = cache.get(epub_path, identity, versions)
+            missing = [name for name in names if name not in hits]
+            order.append((index, epub_path, identity, hits, bool(missing)))
+            if missing:
+                scanner.submit((index, epub_path, missing))
+                inflight += 1
+                while inflight >= scanner.window:
+                    collect(True)
+            while inflight and collect(False):
+                pass
+            yield from drain()
+        while inflight:
+            collect(True)
+            yield from drain()
+    finally:
+        if owned:
+            scanner.close()
+
+def report_book(epub_path, checkers, results, prefix=True):
+    lines = []
+    for name, module in checkers:
+        tag = f"[{name}] " if prefix else ""
+        result, error = results[name]
+        if error is not None:
+            lines.append(f"{tag}Error analyzing {epub_path.name}: {error}")
+            continue
+        for line in module.format_book(epub_path, result):
+            lines.append(f"{tag}{line}")
+    return lines
+
+def report_summary(checkers, collected, prefix=True):
+    lines = []
+    for name, module in checkers:
+        format_summary = getattr(module, 'format_summary', None)
+        if format_summary is None:
+            continue
+        results = [(epub_path, result) for epub_path, result, error in collected[name] if error is None]
+        for line in format_summary(results):
+            lines.append(f"[{name}] {line}" if prefix else line)
+    return lines
+
+def print_book(epub_path, checkers, results):
+    print(f"Scanned {epub_path}", flush=True)
+    for line in report_book(epub_path, checkers, results):
+        print(line, flush=True)
+
+def watch(p, checkers, jobs=1, overrides=None, cache=None, report=None, prefetcher=None):
+    print(f"Watching {p} for new or changed EPUB files", file=sys.stderr, flush=True)
+    scanner = Scanner(checkers, jobs, overrides, prefetcher)
+    try:
+        for epub_paths in watch_paths(p):
+            for epub_path, results in iter_results(epub_paths, checkers, cache=cache, scanner=scanner):
+                if report is None:
+                    print_book(epub_path, checkers, results)
+                else:
+                    report(epub_path, results)
+    except KeyboardInterrupt:
+        print("Stopped watching", file=sys.stderr)
+    finally:
+        scanner.close()
+
+if __name__ == "__main__":
+    import batch_cli
+    sys.exit(batch_cli.main(sys.argv[1:]))
@@ -1,66 +1,43 @@
-from zipfile import ZipFile
+import sys
+import sqlite3
+import hashlib
+import inspect
+from io import BytesIO
 from lxml import etree
-from pathlib import Path, PurePosixPath
+from pathlib import Path
 from collections import Counter
 import last_folder_helper
-from complex_scan import find_opf_path
+from epub_book import EpubBook
+from phase_timing import phase
+from term_matcher import get_matcher
+from confusables import get_folded_matcher
+from text_prefilter import get_prefilter
+from text_index import TextIndex
+from doc_pool import map_documents
 
 SEARCH_STRINGS = ["oceanofpdf", "steelrat", "are belong to us", "gescannt von", "lol.to", "invisibleorder.com", "FULL PROJECT GUTENBERG", "KeVkRaY", "chenjin5.com"]
-user_input = input("Enter search term (ad defaults): ").strip()
-if user_input:
-    search_terms = [user_input]
-else:
-    search_terms = SEARCH_STRINGS.copy()
-print("Searching for:", search_terms)
+search_terms = SEARCH_STRINGS.copy()
+SAFE_CUT_CHARS = frozenset('0123456789!"#$%&()*+,-/;<=>?@[\\]_{|}~')
 printKeyError = False
 reportnooccurrences = False
 print_warnings = False
-
-def parse_opf(z, opf_path):
-    with z.open(opf_path) as f:
-        parser = etree.XMLParser(recover=True)
-        tree = etree.parse(f, parser)
-        root = tree.getroot()
-        opf_ns = 'http://www.idpf.org/2007/opf'
-        if root.nsmap:
-            for prefix, ns in root.nsmap.items():
-                if ns and ns.endswith('/opf'):
-                    opf_ns = ns
-                    break
-        ns = {'opf': opf_ns}
-        manifest = {}
-        manifest_el = root.find('opf:manifest', ns)
-        if manifest_el is not None:
-            for item in manifest_el.findall('opf:item', ns):
-                iid = item.get('id')
-                href = item.get('href')
-                media = item.get('media-type')
-                props = item.get('properties') or ''
-                if iid and href:
-                    manifest[iid] = {'href': href, 'media-type': media, 'properties': props}
-        spine = []
-        spine_el = root.find('opf:spine', ns)
-        if spine_el is not None:
-            for itemref in spine_el.findall('opf:itemref', ns):
-                idref = itemref.get('idref')
-                if idref:
-                    spine.append(idref)
-        opf_dir = PurePosixPath(opf_path).parent.as_posix()
-        return manifest, spine, opf_dir
-
-def resolve_href(opf_dir, href):
-    clean_href = PurePosixPath(href)
-    if '..' in clean_href.parts:
-        if print_warnings: print(f"Warning: Skipping path with '..' components: {href}")
-        return None
-    if not opf_dir:
-        return clean_href.as_posix()
-    return (PurePosixPath(opf_dir) / clean_href).as_posix()
+stream_text = True
+stream_chunk_size = 64 * 1024
+held_text_chars = 16 * 1024
+prefilter = True
+prefilter_max_bytes = 4 * 1024 * 1024
+index_path = None
+sidecar_index = '.search_strings_index.db'
+any_hit = False
+max_count = None
+fold_confusables = False
+doc_threads = 0
 
 def extract_clean_text(data_bytes):
     try:
         parser = etree.HTMLParser(recover=True)
-        tree = etree.fromstring(data_bytes, parser)
+        with phase('lxml_parse'):
+            tree = etree.fromstring(data_bytes, parser)
         xhtml_body = tree.find('.//{http://www.w3.org/1999/xhtml}body')
         html_body = tree.find('.//body')
         if xhtml_body is not None:
@@ -80,45 +57,301 @@ def extract_clean_text(data_bytes):
         except:
             return ''
 
+def safe_cut(text):
+    for i in range(len(text) - 1, -1, -1):
+        if text[i] in SAFE_CUT_CHARS:
+            return i + 1
+    return len(text)
+
+class CleanTextStream:
+    __slots__ = ('sink', 'started', 'pending_space', 'held', 'held_size')
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.started = False
+        self.pending_space = False
+        self.held = []
+        self.held_size = 0
+
+    def feed(self, text):
+        parts = text.split()
+        if not parts:
+            if text:
+                self.pending_space = True
+            return
+        joined = ' '.join(parts)
+        if self.started and (self.pending_space or text[0].isspace()):
+            joined = ' ' + joined
+        self.started = True
+        self.pending_space = text[-1].isspace()
+        self.held.append(joined)
+        self.held_size += len(joined)
+        if self.held_size >= held_text_chars:
+            held = ''.join(self.held)
+            cut = held.rfind(' ') + 1 or safe_cut(held)
+            self.sink.feed(held[:cut].lower())
+            rest = held[cut:]
+            self.held = [rest] if rest else []
+            self.held_size = len(rest)
+
+    def close(self):
+        if self.held:
+            self.sink.feed(''.join(self.held).lower())
+            self.held = []
+            self.held_size = 0
+        return self.sink.results()
+
+class TextSink:
+    __slots__ = ('parts',)
+
+    def __init__(self):
+        self.parts = []
+
+    def feed(self, text):
+        self.parts.append(text)
+
+    def results(self):
+        return ''.join(self.parts)
+
+class TextCollector:
+    def stream(self):
+        return TextSink()
+
+    def count(self, text):
+        return text
+
+class BodyTextTarget:
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.body = None
+        self.document = CleanTextStream(matcher.stream())
+        self.level = 0
+        self.body_level = 0
+        self.finished = False
+        self.empty = True
+
+    def start(self, tag, attrib):
+        if self.finished:
+            return
+        self.empty = False
+        self.level += 1
+        if self.body is None and tag == 'body':
+            self.body = CleanTextStream(self.matcher.stream())
+            self.document = None
+            self.body_level = self.level
+
+    def end(self, tag):
+        if self.finished:
+            return
+        if self.level == self.body_level:
+            self.finished = True
+        self.level -= 1
+        if self.level == 0:
+            self.finished = True
+
+    def data(self, text):
+        if self.finished:
+            return
+        (self.body or self.document).feed(text)
+
+    def close(self):
+        if self.empty:
+            raise ValueError('Document is empty')
+        return (self.body or self.document).close()
+
+def stream_clean_counts(book, name, matcher, data=None):
+    try:
+        parser = etree.HTMLParser(target=BodyTextTarget(matcher), recover=True)
+        with (BytesIO(data) if data is not None else book.open(name)) as f:
+            while True:
+                chunk = f.read(stream_chunk_size)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+        return parser.close()
+    except KeyError:
+        raise
+    except Exception as e:
+        if print_warnings: print(f"Warning: Error parsing content: {e}")
+        if data is None:
+            with book.open(name) as f:
+                data = f.read()
+        try:
+            return matcher.count(data.decode('utf-8', errors='ignore').lower())
+        except:
+            return matcher.count('')
+
+def content_paths(book):
+    content_files = []
+    for item in book.manifest.values():
+        media_type = (item.media_type or '').lower()
+        if (media_type.startswith('text/') or
+            media_type == 'application/xhtml+xml' or
+            media_type == 'image/svg+xml' or
+            media_type == 'application/x-dtbncx+xml'):
+            content_files.append(item.path)
+    return content_files
+
+def triage_order(book, paths):
+    spine_paths = book.spine_paths
+    rank = {}
+    for i, path in enumerate(spine_paths):
+        rank.setdefault(path, i)
+    last = len(spine_paths) - 1
+
+    def key(entry):
+        pos, path = entry
+        i = rank.get(path)
+        if i is None:
+            return (1, 0, pos)
+        return (0, min(i, last - i), i)
+    return [path for pos, path in sorted(enumerate(paths), key=key)]
+
+def early_stop():
+    return any_hit or bool(max_count)
+
+def is_settled(findings, search_terms):
+    if any_hit:
+        return any(findings[s] > 0 for s in search_terms)
+    if max_count:
+        return all(findings[s] >= max_count for s in search_terms)
+    return False
+
+def limit_counts(findings):
+    if max_count:
+        for s in findings:
+            findings[s] = min(findings[s], max_count)
+    return findings
+
+def document_text(book, name):
+    if stream_text:
+        return stream_clean_counts(book, name, TextCollector())
+    return extract_clean_text(book.read(name))
+
+def book_texts(book):
+    if not book.opf_path:
+        return
+    for cf in content_paths(book):
+        try:
+            yield cf, document_text(book, cf)
+        except Exception as e:
+            if print_warnings: print(f"Warning: Error reading {cf}: {e}")
+            continue
+
+def text_version():
+    h = hashlib.sha1()
+    for code in (extract_clean_text, safe_cut, CleanTextStream, TextSink, TextCollector, BodyTextTarget,
+                 stream_clean_counts, content_paths, document_text, book_texts):
+        h.update(inspect.getsource(code).encode())
+    h.update(f'stream_text={stream_text!r} safe_cut_chars={sorted(SAFE_CUT_CHARS)!r}'.encode())
+    return h.hexdigest()[:16]
+
+_text_index = None
+
+def open_text_index():
+    global _text_index
+    if _text_index is None:
+        _text_index = TextIndex(index_path, text_version())
+    return _text_index
+
+def indexed_book_strings(book, search_terms):
+    index = open_text_index()
+    book_id = index.ingest_path(book.path, book_texts, book)
+    index.commit()
+    return limit_counts(index.book_counts(book_id, term_matcher(search_terms)))
+
+def term_matcher(search_terms):
+    if fold_confusables:
+        return get_folded_matcher(search_terms)
+    return get_matcher(search_terms)
+
+def document_counts(book, cf, matcher, term_filter):
+    data = None
+    if term_filter is not None and term_filter.enabled and book.info(cf).file_size <= prefilter_max_bytes:
+        with book.open(cf) as f:
+            data = f.read()
+        if not term_filter.might_match(data):
+            return None
+    if stream_text:
+        return stream_clean_counts(book, cf, matcher, data)
+    return matcher.count(extract_clean_text(data if data is not None else book.read(cf)))
+
 def analyze_epub_strings(epub_path, search_terms):
+    with EpubBook(epub_path) as book:
+        return analyze_book_strings(book, search_terms)
+
+def analyze_book_strings(book, search_terms):
+    epub_path = book.path
     findings = Counter()
     try:
-        with ZipFile(epub_path, 'r') as z:
-            opf_path = find_opf_path(z)
-            if not opf_path:
-                if print_warnings: print(f"Warning: No OPF file found in {epub_path}")
-                return findings
-            manifest, spine, opf_dir = parse_opf(z, opf_path)
-            content_files = []
-            for item in manifest.values():
-                href = resolve_href(opf_dir, item['href'])
-                if href is None:
-                    continue
-                media_type = item.get('media-type', '').lower()
-                if (media_type.startswith('text/') or
-                    media_type == 'application/xhtml+xml' or
-                    media_type == 'image/svg+xml' or
-                    media_type == 'application/x-dtbncx+xml'):
-                    content_files.append(href)
-            for cf in content_files:
-                try:
-                    with z.open(cf) as fh:
-                        data = fh.read()
-                    text = extract_clean_text(data)
+        if not book.opf_path:
+            if print_warnings: print(f"Warning: No OPF file found in {epub_path}")
+            return findings
+        matcher = term_matcher(search_terms)
+        term_filter = get_prefilter(search_terms) if prefilter and not fold_confusables else None
+        content_files = content_paths(book)
+        if early_stop():
+            content_files = triage_order(book, content_files)
+        scan = lambda cf: document_counts(book, cf, matcher, term_filter)
+        for cf, job in map_documents(scan, content_files, doc_threads):
+            try:
+                counts = job.result()
+                if counts is None:
                     for s in search_terms:
-                        findings[s] += text.count(s.lower())
-                except KeyError:
-                    if printKeyError:
-                        if print_warnings: print(f"Warning: File not found in archive: {cf}")
-                    continue
-                except Exception as e:
-                    if print_warnings: print(f"Warning: Error reading {cf}: {e}")
+                        findings[s] += 0
                     continue
+                for s, count in counts:
+                    findings[s] += count
+                if is_settled(findings, search_terms):
+                    break
+            except KeyError:
+                if printKeyError:
+                    if print_warnings: print(f"Warning: File not found in archive: {cf}")
+                continue
+            except Exception as e:
+                if print_warnings: print(f"Warning: Error reading {cf}: {e}")
+                continue
     except Exception as e:
         if print_warnings: print(f"Warning: Error processing {epub_path}: {e}")
-    return findings
+    return limit_counts(findings)
+
+def prepare():
+    term_matcher(search_terms)
+    get_prefilter(search_terms)
+    if index_path:
+        with TextIndex(index_path, text_version()) as index:
+            index.prune()
 
-def main(folder):
+def check_book(book):
+    if index_path:
+        return indexed_book_strings(book, search_terms)
+    return analyze_book_strings(book, search_terms)
+
+def format_book(epub, results):
+    found = {s: c for s, c in results.items() if c > 0}
+    if not found:
+        return []
+    lines = [f"{epub.stem}:"]
+    for s, count in sorted(found.items(), key=lambda x: -x[1]):
+        if any_hit:
+            lines.append(f"  \"{s}\" found")
+        elif max_count and count >= max_count:
+            lines.append(f"  \"{s}\" appears at least {count} times")
+        else:
+            lines.append(f"  \"{s}\" appears {count} times")
+    return lines
+
+def search_index(epub_paths, db_path):
+    with TextIndex(db_path, text_version()) as index:
+        index.prune()
+        index.ingest(epub_paths, book_texts)
+        print(f"Index: {index.updated} updated, {index.removed} removed")
+        found = index.search(search_terms, epub_paths, term_matcher(search_terms))
+    for epub in epub_paths:
+        for line in format_book(epub, limit_counts(found.get(str(epub), Counter()))):
+            print(line)
+
+def main(folder, db_path=None):
     p = Path(folder).expanduser().resolve()
     if not p.is_dir():
         print(f"Folder not found: {p}")
@@ -127,15 +360,26 @@ def main(folder):
     if not epub_paths:
         print("No EPUB files found")
         return
+    db_path = db_path or index_path or (p / sidecar_index if sidecar_index else None)
+    if db_path:
+        try:
+            search_index(epub_paths, db_path)
+            return
+        except sqlite3.OperationalError as e:
+            print(f"Index unavailable at {db_path} ({e}); scanning every book")
     for epub in epub_paths:
         results = analyze_epub_strings(str(epub), search_terms)
-        found = {s: c for s, c in results.items() if c > 0}
-        if found:
-            print(f"{epub.stem}:")
-            for s, count in sorted(found.items(), key=lambda x: -x[1]):
-                print(f"  \"{s}\" appears {count} times")
+        for line in format_book(epub, results):
+            print(line)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 or not sys.stdin.isatty():
+        import batch_cli
+        sys.exit(batch_cli.main(sys.argv[1:], ['search_strings']))
+    user_input = input("Enter search term (ad defaults): ").strip()
+    if user_input:
+        search_terms = [user_input]
+    print("Searching for:", search_terms)
     default = last_folder_helper.get_last_folder()
     user_input = input(f'Input folder ({default}): ').strip()
     folder = user_input or default
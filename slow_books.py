@@ -0,0 +1,174 @@
+import re
+import json
+import heapq
+import pstats
+import cProfile
+from bisect import insort
+from pathlib import Path
+from epub_book import EpubBook
+import phase_timing
+
+keep_slowest = 10
+outlier_factor = 5.0
+min_samples = 10
+min_outlier_seconds = 0.05
+max_profiles = 25
+max_stack_depth = 64
+max_stack_steps = 200000
+
+def safe_name(text):
+    return re.sub(r'[^\w.-]+', '_', text)[:80]
+
+def frame_label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f"{Path(filename).stem}:{name}:{line}"
+
+def collapsed_stacks(stats):
+    children = {}
+    roots = []
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, caller_stats in callers.items():
+            children.setdefault(caller, []).append((func, caller_stats[3]))
+    stacks = {}
+    steps = 0
+
+    def walk(func, share, path):
+        nonlocal steps
+        steps += 1
+        cc, nc, tt, ct, callers = stats[func]
+        path = path + [func]
+        own = tt * share
+        if own > 0:
+            key = ';'.join(frame_label(f) for f in path)
+            stacks[key] = stacks.get(key, 0.0) + own
+        if len(path) >= max_stack_depth:
+            return
+        for child, child_ct in children.get(func, ()):
+            if steps >= max_stack_steps:
+                return
+            if child in path:
+                continue
+            total = stats[child][3]
+            if total > 0 and share * child_ct >= 5e-7:
+                walk(child, share * child_ct / total, path)
+
+    for root in roots:
+        walk(root, 1.0, [])
+    return [f"{key} {round(seconds * 1e6)}" for key, seconds in sorted(stacks.items()) if round(seconds * 1e6) > 0]
+
+def book_breakdown(entries, checker_name):
+    phases = {}
+    total = 0.0
+    for (name, phase), (calls, wall, cpu, nbytes) in entries.items():
+        if name != checker_name:
+            continue
+        phases[phase] = {'calls': calls, 'wall': wall, 'cpu': cpu, 'bytes': nbytes}
+        total += wall
+    return total, phases
+
+class SlowBookLog:
+    def __init__(self, checkers, out_dir):
+        self.modules = dict(checkers)
+        self.out_dir = Path(out_dir).expanduser()
+        self.samples = {}
+        self.slowest = {}
+        self.profiles = []
+        self.outliers = []
+        self.sequence = 0
+
+    def attach(self):
+        phase_timing.enabled = True
+        phase_timing.observers.append(self.observe)
+
+    def detach(self):
+        if self.observe in phase_timing.observers:
+            phase_timing.observers.remove(self.observe)
+
+    def observe(self, book):
+        path, entries = book
+        checker_names = {name for name, _ in entries if name in self.modules}
+        for checker_name in checker_names:
+            seconds, phases = book_breakdown(entries, checker_name)
+            samples = self.samples.setdefault(checker_name, [])
+            median = samples[len(samples) // 2] if len(samples) >= min_samples else None
+            insort(samples, seconds)
+            self.sequence += 1
+            heap = self.slowest.setdefault(checker_name, [])
+            item = (seconds, self.sequence, path, phases, median)
+            if len(heap) < keep_slowest:
+                heapq.heappush(heap, item)
+            elif seconds > heap[0][0]:
+                heapq.heapreplace(heap, item)
+            if (median is not None and seconds >= min_outlier_seconds and seconds > outlier_factor * median and
+                    len(self.outliers) < max_profiles):
+                self.outliers.append((checker_name, path, seconds, median))
+
+    def profile_outliers(self):
+        while self.outliers:
+            self.profile(*self.outliers.pop(0))
+
+    def profile(self, checker_name, path, seconds, median):
+        module = self.modules[checker_name]
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"{len(self.profiles) + 1:03d}_{checker_name}_{safe_name(Path(path).stem)}"
+        prof_path = self.out_dir / f"{stem}.prof"
+        collapsed_path = self.out_dir / f"{stem}.collapsed"
+        profiler = cProfile.Profile()
+        enabled = phase_timing.enabled
+        phase_timing.enabled = False
+        error = None
+        try:
+            with EpubBook(path) as book:
+                profiler.runcall(module.check_book, book)
+        except Exception as e:
+            error = str(e)
+        finally:
+            phase_timing.enabled = enabled
+        profiler.dump_stats(str(prof_path))
+        stats = pstats.Stats(profiler).stats
+        collapsed_path.write_text('\n'.join(collapsed_stacks(stats)) + '\n')
+        self.profiles.append({'checker': checker_name, 'path': path, 'seconds': seconds, 'median': median,
+                              'profile': str(prof_path), 'collapsed': str(collapsed_path), 'error': error})
+
+    def report(self):
+        checkers = {}
+        for checker_name in self.modules:
+            heap = self.slowest.get(checker_name)
+            if not heap:
+                continue
+            samples = self.samples[checker_name]
+            checkers[checker_name] = {
+                'books': len(samples),
+                'median': samples[len(samples) // 2],
+                'slowest': [{'path': path, 'seconds': seconds, 'median_at_scan': median, 'phases': phases}
+                            for seconds, _, path, phases, median in sorted(heap, reverse=True)],
+            }
+        return {'checkers': checkers, 'profiles': self.profiles}
+
+    def format_report(self, report=None):
+        report = report or self.report()
+        lines = []
+        for checker_name, entry in report['checkers'].items():
+            lines.append(f"{checker_name}: {entry['books']} books, median {entry['median'] * 1000:.2f} ms")
+            for slow in entry['slowest']:
+                breakdown = ', '.join(f"{phase} {values['wall'] * 1000:.1f}"
+                                      for phase, values in sorted(slow['phases'].items(),
+                                                                  key=lambda item: -item[1]['wall']))
+                lines.append(f"  {slow['seconds'] * 1000:9.2f} ms  {slow['path']}  ({breakdown})")
+        for profile in report['profiles']:
+            lines.append(f"Profiled {profile['checker']} on {profile['path']}: {profile['seconds'] * 1000:.1f} ms vs "
+                         f"median {profile['median'] * 1000:.1f} ms -> {profile['profile']}")
+        return lines
+
+    def write(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.profile_outliers()
+        report = self.report()
+        (self.out_dir / 'slow_books.json').write_text(json.dumps(report, indent=2) + '\n')
+        lines = self.format_report(report)
+        (self.out_dir / 'slow_books.txt').write_text('\n'.join(lines) + '\n')
+        return lines
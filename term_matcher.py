@@ -0,0 +1,130 @@
+from collections import deque
+from functools import lru_cache
+
+min_automaton_patterns = 175
+
+class TermMatcher:
+    __slots__ = ('terms', 'patterns', 'term_patterns', 'lengths', 'max_length', 'automaton', 'delta', 'outputs')
+
+    def __init__(self, terms, automaton=None):
+        self.terms = tuple(terms)
+        self.patterns = []
+        self.term_patterns = []
+        index_of = {}
+        for term in self.terms:
+            pattern = term.lower()
+            if pattern and pattern not in index_of:
+                index_of[pattern] = len(self.patterns)
+                self.patterns.append(pattern)
+            self.term_patterns.append(index_of.get(pattern))
+        self.lengths = [len(p) for p in self.patterns]
+        self.max_length = max(self.lengths, default=0)
+        if automaton is None:
+            automaton = len(self.patterns) >= min_automaton_patterns
+        self.automaton = automaton
+        self.delta = None
+        self.outputs = None
+        if automaton:
+            self._build()
+
+    def _build(self):
+        goto = [{}]
+        outputs = [()]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    goto.append({})
+                    outputs.append(())
+                    nxt = len(goto) - 1
+                    goto[state][ch] = nxt
+                state = nxt
+            outputs[state] += (index,)
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            delta[state] = dict(delta[fail[state]])
+            delta[state].update(goto[state])
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0)
+                outputs[child] += outputs[fail[child]]
+                queue.append(child)
+        self.delta = delta
+        self.outputs = outputs
+
+    def stream(self):
+        return TermStream(self)
+
+    def count(self, text):
+        stream = self.stream()
+        stream.feed(text)
+        return stream.results()
+
+class TermStream:
+    __slots__ = ('matcher', 'state', 'counts', 'last_end', 'offset', 'carry')
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.state = 0
+        self.counts = [0] * len(matcher.patterns)
+        self.last_end = [0] * len(matcher.patterns)
+        self.offset = 0
+        self.carry = ''
+
+    def feed(self, text):
+        if not text:
+            return
+        if self.matcher.automaton:
+            self._feed_automaton(text)
+        else:
+            self._feed_find(text)
+        self.offset += len(text)
+
+    def _feed_find(self, text):
+        buf = self.carry + text
+        base = self.offset - len(self.carry)
+        counts = self.counts
+        last_end = self.last_end
+        for index, pattern in enumerate(self.matcher.patterns):
+            pos = max(0, last_end[index] - base)
+            i = buf.find(pattern, pos)
+            while i != -1:
+                counts[index] += 1
+                pos = i + len(pattern)
+                i = buf.find(pattern, pos)
+            last_end[index] = max(last_end[index], base + pos)
+        keep = self.matcher.max_length - 1
+        self.carry = buf[-keep:] if keep > 0 else ''
+
+    def _feed_automaton(self, text):
+        delta = self.matcher.delta
+        outputs = self.matcher.outputs
+        lengths = self.matcher.lengths
+        counts = self.counts
+        last_end = self.last_end
+        state = self.state
+        for end, ch in enumerate(text, self.offset + 1):
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                for index in outputs[state]:
+                    if end - lengths[index] >= last_end[index]:
+                        counts[index] += 1
+                        last_end[index] = end
+        self.state = state
+
+    def results(self):
+        results = []
+        for term, index in zip(self.matcher.terms, self.matcher.term_patterns):
+            results.append((term, self.offset + 1 if index is None else self.counts[index]))
+        return results
+
+@lru_cache(maxsize=32)
+def _compile(terms):
+    return TermMatcher(terms)
+
+def get_matcher(terms):
+    return _compile(tuple(terms))
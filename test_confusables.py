@@ -0,0 +1,24 @@
+import pytest
+from confusables import get_folded_matcher
+
+@pytest.mark.parametrize('text', [
+    'o c e a n o f p d f',
+    'o.c.e.a.n.o.f.p.d.f',
+    'ocean of pdf',
+    'OceanOfPDF',
+    'оcеаnоfрdf',
+    'ocean​of‍pdf',
+])
+def test_obfuscated_watermark(text):
+    assert get_folded_matcher(['oceanofpdf']).count(text) == [('oceanofpdf', 1)]
+
+def test_multi_word_terms_keep_boundaries():
+    matcher = get_folded_matcher(['steel rat', 'lol.to'])
+    assert matcher.count('steel  rat, steelrat; lol to lolto') == [('steel rat', 1), ('lol.to', 1)]
+
+def test_stream_matches_across_chunks():
+    matcher = get_folded_matcher(['oceanofpdf', 'steel rat'])
+    stream = matcher.stream()
+    for chunk in ['o c e a', ' n o f ', 'p d f steel ', ' rat']:
+        stream.feed(chunk)
+    assert stream.results() == [('oceanofpdf', 1), ('steel rat', 1)]
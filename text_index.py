@@ -0,0 +1,182 @@
+import os
+import sqlite3
+from collections import Counter
+from pathlib import Path
+from epub_book import EpubBook
+from result_cache import file_identity
+from term_matcher import TermMatcher, get_matcher
+
+commit_every = 50
+min_indexed_term = 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    book_id INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_book ON documents (book_id);
+'''
+
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS texts USING fts5(text, tokenize='trigram')"
+PLAIN_SCHEMA = 'CREATE TABLE IF NOT EXISTS texts (id INTEGER PRIMARY KEY, text TEXT NOT NULL)'
+
+def fts_phrase(pattern):
+    return '"' + pattern.replace('"', '""') + '"'
+
+class TextIndex:
+    def __init__(self, db_path, version):
+        self.db_path = str(Path(db_path).expanduser())
+        self.version = version
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.execute(FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            self.conn.execute(PLAIN_SCHEMA)
+        sql = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'texts'").fetchone()[0]
+        self.fts = 'fts5' in sql.lower()
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != version:
+            self.clear()
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+        self.conn.commit()
+        self.pending = 0
+        self.updated = 0
+        self.removed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.conn is None:
+            return
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+
+    def clear(self):
+        self.conn.execute('DELETE FROM texts')
+        self.conn.execute('DELETE FROM documents')
+        self.conn.execute('DELETE FROM books')
+
+    def _drop_book(self, book_id):
+        self.conn.execute('DELETE FROM texts WHERE rowid IN (SELECT id FROM documents WHERE book_id = ?)', (book_id,))
+        self.conn.execute('DELETE FROM documents WHERE book_id = ?', (book_id,))
+        self.conn.execute('DELETE FROM books WHERE id = ?', (book_id,))
+
+    def ingest(self, epub_paths, extract):
+        for epub_path in epub_paths:
+            try:
+                self.ingest_path(epub_path, extract)
+            except OSError:
+                continue
+            self._maybe_commit()
+        self.commit()
+
+    def ingest_path(self, epub_path, extract, book=None):
+        path = str(epub_path)
+        identity = file_identity(path)
+        row = self.conn.execute('SELECT id, size, mtime_ns, inode FROM books WHERE path = ?', (path,)).fetchone()
+        if row is not None:
+            if tuple(row[1:]) == identity:
+                return row[0]
+            self._drop_book(row[0])
+        try:
+            if book is not None:
+                texts = list(extract(book))
+            else:
+                with EpubBook(path) as opened:
+                    texts = list(extract(opened))
+        except Exception:
+            texts = []
+        size, mtime_ns, inode = identity
+        book_id = self.conn.execute(
+            'INSERT INTO books (path, size, mtime_ns, inode) VALUES (?, ?, ?, ?)',
+            (path, size, mtime_ns, inode)).lastrowid
+        for name, text in texts:
+            doc_id = self.conn.execute(
+                'INSERT INTO documents (book_id, name) VALUES (?, ?)', (book_id, name)).lastrowid
+            self.conn.execute('INSERT INTO texts (rowid, text) VALUES (?, ?)', (doc_id, text))
+        self.updated += 1
+        return book_id
+
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def prune(self):
+        doomed = [book_id for book_id, path in self.conn.execute('SELECT id, path FROM books').fetchall()
+                  if not os.path.exists(path)]
+        for book_id in doomed:
+            self._drop_book(book_id)
+        self.conn.commit()
+        self.removed += len(doomed)
+        return len(doomed)
+
+    def _maybe_commit(self):
+        self.pending += 1
+        if self.pending >= commit_every:
+            self.conn.commit()
+            self.pending = 0
+
+    def _match_expression(self, matcher):
+        indexable = (self.fts and isinstance(matcher, TermMatcher) and matcher.patterns and
+                     None not in matcher.term_patterns and min(matcher.lengths) >= min_indexed_term)
+        if not indexable:
+            return None
+        return ' OR '.join(fts_phrase(pattern) for pattern in matcher.patterns)
+
+    def _candidate_rows(self, matcher):
+        query = 'SELECT documents.book_id, texts.text FROM texts JOIN documents ON documents.id = texts.rowid'
+        match = self._match_expression(matcher)
+        if match is None:
+            return self.conn.execute(query)
+        return self.conn.execute(query + ' WHERE texts MATCH ?', (match,))
+
+    def book_counts(self, book_id, matcher):
+        first, last = self.conn.execute(
+            'SELECT MIN(id), MAX(id) FROM documents WHERE book_id = ?', (book_id,)).fetchone()
+        counts = Counter()
+        if first is None:
+            return counts
+        match = self._match_expression(matcher)
+        if match is None:
+            rows = self.conn.execute('SELECT text FROM texts WHERE rowid BETWEEN ? AND ?', (first, last))
+        else:
+            for term in matcher.terms:
+                counts[term] = 0
+            rows = self.conn.execute('SELECT text FROM texts WHERE texts MATCH ? AND rowid BETWEEN ? AND ?',
+                                     (match, first, last))
+        for (text,) in rows:
+            for term, count in matcher.count(text):
+                counts[term] += count
+        return counts
+
+    def search(self, terms, epub_paths=None, matcher=None):
+        matcher = matcher or get_matcher(terms)
+        by_book = {}
+        for book_id, text in self._candidate_rows(matcher):
+            for term, count in matcher.count(text):
+                if count:
+                    by_book.setdefault(book_id, Counter())[term] += count
+        paths = dict(self.conn.execute('SELECT id, path FROM books'))
+        wanted = None if epub_paths is None else {str(p) for p in epub_paths}
+        return {paths[book_id]: counts for book_id, counts in by_book.items()
+                if wanted is None or paths[book_id] in wanted}
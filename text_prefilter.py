@@ -0,0 +1,88 @@
+import re
+import codecs
+import html
+from functools import lru_cache
+
+anchor_length = 4
+
+CHARSET_RE = re.compile(rb'''(?:charset|encoding)\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)''', re.I)
+UNSAFE_TERM_CHARS = frozenset('<>&')
+
+def fold(text):
+    return ' '.join(text.split()).lower().replace('ς', 'σ')
+
+def is_prefilterable(term):
+    folded = term.lower()
+    if not folded or UNSAFE_TERM_CHARS.intersection(folded):
+        return False
+    if any(not ch.isprintable() and ch != ' ' for ch in folded):
+        return False
+    return '  ' not in folded and all(ch == ' ' or not ch.isspace() for ch in folded)
+
+class TermProbe:
+    __slots__ = ('term', 'prefixes', 'suffixes')
+
+    def __init__(self, term):
+        t = term.lower().replace('ς', 'σ')
+        n = len(t)
+        self.term = t
+        self.prefixes = [t[:a] + '<' for a in range(1, min(anchor_length, n))]
+        self.suffixes = ['>' + t[b:] for b in range(max(1, n - anchor_length + 1), n)]
+        if n > anchor_length:
+            self.prefixes.append(t[:anchor_length])
+            self.suffixes.append(t[-anchor_length:])
+
+    def might_match(self, folded):
+        if self.term in folded:
+            return True
+        return any(p in folded for p in self.prefixes) and any(s in folded for s in self.suffixes)
+
+class TermPrefilter:
+    __slots__ = ('terms', 'probes', 'enabled')
+
+    def __init__(self, terms):
+        self.terms = tuple(terms)
+        self.enabled = bool(self.terms) and all(is_prefilterable(t) for t in self.terms)
+        self.probes = [TermProbe(t) for t in dict.fromkeys(self.terms)] if self.enabled else []
+
+    def decoded_texts(self, data):
+        if b'\x00' in data or data[:2] in (b'\xff\xfe', b'\xfe\xff'):
+            return None
+        if data.isascii():
+            texts = [data.decode('ascii')]
+        else:
+            encodings = {'latin-1'}
+            for m in CHARSET_RE.finditer(data):
+                try:
+                    encodings.add(codecs.lookup(m.group(1).decode('ascii')).name)
+                except LookupError:
+                    return None
+            texts = [data.decode('utf-8', errors='ignore')]
+            for encoding in encodings:
+                try:
+                    texts.append(data.decode(encoding))
+                except UnicodeDecodeError:
+                    if encoding != 'utf-8':
+                        return None
+        return texts
+
+    def folded_texts(self, texts):
+        for text in texts:
+            yield fold(text)
+            if '&' in text:
+                yield fold(html.unescape(text))
+
+    def might_match(self, data):
+        if not self.enabled:
+            return True
+        texts = self.decoded_texts(data)
+        if texts is None:
+            return True
+        return any(probe.might_match(text) for text in self.folded_texts(texts) for probe in self.probes)
+
+@lru_cache(maxsize=32)
+def _compile(terms):
+    return TermPrefilter(terms)
+
+def get_prefilter(terms):
+    return _compile(tuple(terms))